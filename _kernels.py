@@ -0,0 +1,170 @@
+"""
+Kernels numéricos JIT opcionales (Numba) para las transformaciones de
+píxeles cuando OpenCV no está instalado. Con `cache=True` la compilación
+se persiste en disco y no penaliza el arranque del nodo RPC.
+
+Los kernels son deliberadamente seriales (sin parallel=True): los nodos
+ya paralelizan por imagen con ThreadPoolExecutor, así que el paralelismo
+interno sólo sobresuscribiría la CPU, y el workqueue de numba se cuelga
+al salir del intérprete si el primer kernel paralelo se lanzó desde un
+hilo que no es el principal (justo lo que hace un pool).
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from numba import njit
+    _NUMBA = np is not None
+except ImportError:
+    _NUMBA = False
+
+DISPONIBLE = _NUMBA
+
+
+if _NUMBA:
+
+    @njit(fastmath=True, cache=True)
+    def _bc_plano(plano, alpha, beta, salida):
+        """out = clamp(px * alpha + beta) sobre el buffer aplanado."""
+        for i in range(plano.shape[0]):
+            v = plano[i] * alpha + beta
+            if v < 0.0:
+                v = 0.0
+            elif v > 255.0:
+                v = 255.0
+            salida[i] = v
+
+    # En los tres kernels los flips se expresan como base + paso
+    # calculados fuera del loop caliente, sin ramas por píxel.
+
+    @njit(fastmath=True, cache=True)
+    def _cadena_2d(img, flip_h, flip_v, lut, salida):
+        """Flip + LUT sobre un plano L en un solo recorrido."""
+        alto, ancho = img.shape
+        base_i = alto - 1 if flip_v else 0
+        paso_i = -1 if flip_v else 1
+        base_j = ancho - 1 if flip_h else 0
+        paso_j = -1 if flip_h else 1
+        for i in range(alto):
+            fi = base_i + paso_i * i
+            for j in range(ancho):
+                salida[i, j] = lut[img[fi, base_j + paso_j * j]]
+
+    @njit(fastmath=True, cache=True)
+    def _cadena_rgb(img, flip_h, flip_v, lut, salida):
+        """Flip + LUT sobre RGB en un solo recorrido."""
+        alto, ancho, canales = img.shape
+        base_i = alto - 1 if flip_v else 0
+        paso_i = -1 if flip_v else 1
+        base_j = ancho - 1 if flip_h else 0
+        paso_j = -1 if flip_h else 1
+        for i in range(alto):
+            fi = base_i + paso_i * i
+            for j in range(ancho):
+                fj = base_j + paso_j * j
+                for c in range(canales):
+                    salida[i, j, c] = lut[img[fi, fj, c]]
+
+    @njit(fastmath=True, cache=True)
+    def _cadena_gris(img, flip_h, flip_v, lut, salida):
+        """Flip + gris BT.601 (misma aritmética entera que convert('L')
+        de PIL) + LUT, todo en un recorrido."""
+        alto = img.shape[0]
+        ancho = img.shape[1]
+        base_i = alto - 1 if flip_v else 0
+        paso_i = -1 if flip_v else 1
+        base_j = ancho - 1 if flip_h else 0
+        paso_j = -1 if flip_h else 1
+        for i in range(alto):
+            fi = base_i + paso_i * i
+            for j in range(ancho):
+                fj = base_j + paso_j * j
+                v = (19595 * np.uint32(img[fi, fj, 0])
+                     + 38470 * np.uint32(img[fi, fj, 1])
+                     + 7471 * np.uint32(img[fi, fj, 2])
+                     + 32768) >> 16
+                salida[i, j] = lut[v]
+
+    @njit(fastmath=True, cache=True)
+    def _perfilar_3x3(img, factor, salida):
+        """
+        Mezcla imagen y su suavizado 3x3 (kernel SMOOTH de PIL, peso
+        central 5, suma 13): out = suave + factor * (img - suave).
+        Los bordes se copian sin mezclar. Recorre (y, x, c) para
+        mantener el acceso secuencial en memoria.
+        """
+        alto, ancho, canales = img.shape
+        for y in range(alto):
+            for x in range(ancho):
+                for c in range(canales):
+                    if y == 0 or y == alto - 1 or x == 0 or x == ancho - 1:
+                        salida[y, x, c] = img[y, x, c]
+                        continue
+                    suma = (img[y - 1, x - 1, c] + img[y - 1, x, c] + img[y - 1, x + 1, c]
+                            + img[y, x - 1, c] + 5.0 * img[y, x, c] + img[y, x + 1, c]
+                            + img[y + 1, x - 1, c] + img[y + 1, x, c] + img[y + 1, x + 1, c])
+                    suave = suma / 13.0
+                    v = suave + factor * (img[y, x, c] - suave)
+                    if v < 0.0:
+                        v = 0.0
+                    elif v > 255.0:
+                        v = 255.0
+                    salida[y, x, c] = v
+
+
+def brillo_contraste(arr, brillo=1.0, contraste=1.0):
+    """
+    Equivalente a ImageEnhance.Brightness + Contrast sobre un ndarray
+    uint8 (RGB o L): el brillo multiplica y el contraste escala
+    alrededor de la media en gris. Retorna un ndarray uint8 nuevo.
+    """
+    plano = arr.astype(np.float32).ravel()
+    if brillo != 1.0:
+        salida = np.empty_like(plano)
+        _bc_plano(plano, brillo, 0.0, salida)
+        plano = salida
+    if contraste != 1.0:
+        if arr.ndim == 3:
+            media = float(
+                (plano.reshape(arr.shape) @ np.float32([0.299, 0.587, 0.114])).mean())
+        else:
+            media = float(plano.mean())
+        salida = np.empty_like(plano)
+        _bc_plano(plano, contraste, media * (1.0 - contraste), salida)
+        plano = salida
+    return plano.reshape(arr.shape).astype(np.uint8)
+
+
+def cadena(arr, gris, flip_h, flip_v, lut):
+    """
+    Corrida fusionada de operaciones por píxel sobre un ndarray uint8
+    (RGB o L): reflejos, conversión a gris y una LUT de 256 entradas
+    (identidad si no hay ajuste) en un único recorrido.
+    Retorna un ndarray uint8 nuevo (2-D si el resultado es gris).
+    """
+    lut = np.asarray(lut, dtype=np.uint8)
+    if arr.ndim == 2:
+        salida = np.empty_like(arr)
+        _cadena_2d(arr, flip_h, flip_v, lut, salida)
+    elif gris:
+        salida = np.empty(arr.shape[:2], dtype=np.uint8)
+        _cadena_gris(arr, flip_h, flip_v, lut, salida)
+    else:
+        salida = np.empty_like(arr)
+        _cadena_rgb(arr, flip_h, flip_v, lut, salida)
+    return salida
+
+
+def perfilar(arr, factor=2.0):
+    """Nitidez tipo ImageEnhance.Sharpness sobre un ndarray uint8."""
+    era_2d = arr.ndim == 2
+    img = arr.astype(np.float32)
+    if era_2d:
+        img = img[:, :, np.newaxis]
+    salida = np.empty_like(img)
+    _perfilar_3x3(img, factor, salida)
+    resultado = salida.astype(np.uint8)
+    return resultado[:, :, 0] if era_2d else resultado
@@ -10,10 +10,12 @@ from PIL import Image
 def decodificar_imagen(data_codificada: str) -> Image.Image:
     # Decodificar Base64
     data_binaria = base64.b64decode(data_codificada)
-    # Descomprimir Gzip
-    data_descomprimida = gzip.decompress(data_binaria)
+    # Descomprimir Gzip sólo si trae la envoltura (los JPEG/PNG/WEBP
+    # con compresion="ninguna" viajan directos)
+    if data_binaria[:2] == b'\x1f\x8b':
+        data_binaria = gzip.decompress(data_binaria)
     # Crear imagen desde bytes
-    return Image.open(io.BytesIO(data_descomprimida))
+    return Image.open(io.BytesIO(data_binaria))
 
 # -------------------------------
 # Cargar XML y extraer imágenes
@@ -1,32 +1,59 @@
+import base64
+import functools
+import gzip
+import io
+import hashlib
+import logging
 import os
 import threading
 import time
-from flask import Flask, request, jsonify, Response
-from flask_cors import CORS
+from collections import OrderedDict
 from werkzeug.serving import make_server
-import xml.etree.ElementTree as ET
-from objects import NodoOptimizado, LectorXML
+from rest import crear_app
+# lxml (libxml2, C) parsea y serializa XML varias veces mÃ¡s rÃ¡pido que
+# el ElementTree puro de la stdlib; si no estÃ¡ instalado se usa stdlib.
+try:
+    from lxml import etree as ET
+    _XML_PARSE_ERROR = ET.XMLSyntaxError
+except ImportError:
+    import xml.etree.ElementTree as ET
+    _XML_PARSE_ERROR = ET.ParseError
+from objects import NodoOptimizado, LectorXML, _gzip_descomprimir_todo
 import socket
 import subprocess
 import re
 import json
+
+# orjson (Rust) serializa JSON 3-5x mÃ¡s rÃ¡pido que la stdlib, sobre todo
+# con strings grandes embebidos (los XML de respuesta); opcional.
+try:
+    import orjson
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    _json_dumps = json.dumps
 import sys
 import xmlrpc.server
 import xmlrpc.client
-from socketserver import ThreadingMixIn
+from concurrent.futures import ThreadPoolExecutor
 
+@functools.lru_cache(maxsize=1)
 def obtener_ip_real():
     """
-    Obtiene la IP real de la mÃ¡quina en la red local.
+    Obtiene la IP real de la mÃ¡quina en la red local. Memoizada: la IP
+    no cambia en vida del proceso y los fallbacks con subprocess pueden
+    costar hasta 9s de timeouts acumulados.
     """
-    # MÃ©todo 1: Conectar a un servidor externo (mÃ¡s confiable)
+    # MÃ©todo 1: Conectar a un servidor externo (mÃ¡s confiable y barato:
+    # el connect UDP no manda paquetes, sÃ³lo resuelve la ruta local)
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
             s.connect(("8.8.8.8", 80))
             ip = s.getsockname()[0]
             if not ip.startswith("127."):
                 return ip
-    except:
+    except OSError:
         pass
     
     # MÃ©todo 2: Usar ip route (Linux/Mac)
@@ -36,7 +63,7 @@ def obtener_ip_real():
         match = re.search(r'src (\d+\.\d+\.\d+\.\d+)', result.stdout)
         if match:
             return match.group(1)
-    except:
+    except (OSError, subprocess.SubprocessError):
         pass
     
     # MÃ©todo 3: Usar hostname -I (Linux)
@@ -47,7 +74,7 @@ def obtener_ip_real():
         for ip in ips:
             if not ip.startswith("127.") and "." in ip:
                 return ip
-    except:
+    except (OSError, subprocess.SubprocessError):
         pass
     
     # Fallback
@@ -55,187 +82,304 @@ def obtener_ip_real():
         ip = socket.gethostbyname(socket.gethostname())
         if not ip.startswith("127."):
             return ip
-    except:
+    except OSError:
         pass
     
     return "127.0.0.1"
 
+# Pool persistente para procesar imÃ¡genes del batch en paralelo
+# (PIL libera el GIL en decode/filtros/encode, asÃ­ que los hilos escalan)
+@functools.lru_cache(maxsize=256)
+def _compilar_transformaciones(transformaciones):
+    """
+    Compila la cadena de transformaciones a una tupla ((mÃ©todo, args), ...)
+    una sola vez por cadena distinta. Los batches repiten las mismas 3-4
+    cadenas sobre miles de imÃ¡genes; el parseo por substring y split se
+    paga una vez y los workers iteran llamadas directas.
+    """
+    plan = []
+    for trans in transformaciones.split(', '):
+        if 'escala_grises' in trans:
+            plan.append(('escala_grises', ()))
+        elif 'rotar' in trans:
+            angle = 45
+            if '_' in trans:
+                token = trans.split('_')[-1].replace('Â°', '')
+                if token.lstrip('-').isdigit():
+                    angle = int(token)
+            plan.append(('rotar', (angle,)))
+        elif 'redimensionar' in trans:
+            if 'x' in trans:
+                dims = trans.split('_')[1].split('x')
+                if len(dims) == 2 and dims[0].isdigit() and dims[1].isdigit():
+                    plan.append(('redimensionar', ((int(dims[0]), int(dims[1])),)))
+                else:
+                    plan.append(('redimensionar', ()))
+        elif 'reflejar' in trans:
+            direccion = trans.split('_')[1] if '_' in trans else 'horizontal'
+            plan.append(('reflejar', (direccion,)))
+        elif 'desenfocar' in trans:
+            radio = int(trans.split('_')[-1]) if '_' in trans else 2
+            plan.append(('desenfocar', (radio,)))
+        elif 'perfilar' in trans:
+            factor = float(trans.split('_')[-1]) if '_' in trans else 2.0
+            plan.append(('perfilar', (factor,)))
+        elif 'ajustar_brillo' in trans:
+            # parsear brillo_X_contraste_Y
+            parts = trans.split('_')
+            brillo = float(parts[2]) if len(parts) > 2 else 1.0
+            contraste = float(parts[4]) if len(parts) > 4 else 1.0
+            plan.append(('ajustar_brillo_contraste', (brillo, contraste)))
+        elif 'insertar_texto' in trans:
+            texto = trans.split('_', 2)[2] if '_' in trans else "Marca"
+            plan.append(('insertar_texto', (texto,)))
+        elif 'convertir_a' in trans:
+            plan.append(('convertir_formato', (trans.split('_')[-1],)))
+        elif 'recortar' in trans:
+            # NecesitarÃ­as definir formato para box
+            pass
+    return tuple(plan)
+
+
+# Logger perezoso para rutas calientes: bajo un batch malo el print por
+# imagen serializa a los workers en el lock de stdout; logging formatea
+# sÃ³lo si el nivel estÃ¡ habilitado y escribe bufferizado.
+log = logging.getLogger(__name__)
+
+_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix='img')
+
 # URL del balanceador - CONFIGURABLE
 BALANCEADOR_IP = "192.168.154.129"  # Cambiar por la IP real del balanceador
 BALANCEADOR_RPC_URL = f"http://{BALANCEADOR_IP}:8000"
 
-class ThreadedXMLRPCServer(ThreadingMixIn, xmlrpc.server.SimpleXMLRPCServer):
-    pass
+class ThreadedXMLRPCServer(xmlrpc.server.SimpleXMLRPCServer):
+    """
+    Servidor XML-RPC respaldado por un pool de hilos fijo, en lugar del
+    hilo-por-request sin lÃ­mite de ThreadingMixIn. Bajo rÃ¡fagas evita el
+    costo de crear hilos de kernel y el thrashing de context switches.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+    _executor = ThreadPoolExecutor(max_workers=2 * (os.cpu_count() or 4),
+                                   thread_name_prefix='rpc')
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._procesar_request, request, client_address)
+
+    def _procesar_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
 
 class GestorNodos:
+    # Resultados memoizados por hash de contenido (reintentos idempotentes)
+    _CACHE_RESULTADOS_MAX = 4096
+
     def __init__(self):
         self.nodos_activos = {}
         self.capacidad_maxima = 100000
         self.estado = "disponible"
         self.imagenes_procesando = 0
         self.lock = threading.Lock()
+        self._cache_resultados = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Candados por clave en curso: dos imÃ¡genes idÃ©nticas concurrentes
+        # esperan a un solo productor en vez de procesar dos veces
+        self._claves_en_curso = {}
+
+    @staticmethod
+    def _clave_cache(datos_crudos, transformaciones, formato, calidad):
+        """Hash barato del contenido + parÃ¡metros (BLAKE2b va a ~GB/s)."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(datos_crudos)
+        h.update(transformaciones.encode('utf-8'))
+        h.update(formato.encode('utf-8'))
+        h.update(b"%d" % calidad)
+        return h.digest()
+
+    def _cache_obtener(self, clave):
+        with self._cache_lock:
+            par = self._cache_resultados.get(clave)
+            if par is not None:
+                self._cache_resultados.move_to_end(clave)
+            return par
+
+    def _cache_guardar(self, clave, atributos, texto):
+        with self._cache_lock:
+            self._cache_resultados[clave] = (atributos, texto)
+            self._cache_resultados.move_to_end(clave)
+            while len(self._cache_resultados) > self._CACHE_RESULTADOS_MAX:
+                self._cache_resultados.popitem(last=False)
     
     def procesar_xml_imagenes(self, xml_content, aplicar_transformaciones=True):
         """
         Procesa un XML con mÃºltiples imÃ¡genes y aplica transformaciones.
-        Retorna XML fusionado con todas las imÃ¡genes procesadas.
+        Acepta `bytes` o `str` (ET.fromstring parsea bytes directo en expat,
+        sin decodificar antes). Retorna XML fusionado con todas las imÃ¡genes
+        procesadas.
         """
         num_imagenes = 0
         try:
+            if isinstance(xml_content, str):
+                # lxml no acepta str con declaraciÃ³n de encoding
+                xml_content = xml_content.encode('utf-8')
             root = ET.fromstring(xml_content)
             imagenes = root.findall('imagen')
             num_imagenes = len(imagenes)
             
             if not imagenes:
                 return self._crear_xml_error("No se encontraron imÃ¡genes en el XML")
-        except:
+        except _XML_PARSE_ERROR:
             return self._crear_xml_error("XML malformado")
         
+        # SecciÃ³n crÃ­tica mÃ­nima: sÃ³lo chequeo + incremento del contador.
         with self.lock:
             if self.imagenes_procesando + num_imagenes > self.capacidad_maxima:
                 return self._crear_xml_error("Capacidad mÃ¡xima excedida")
             self.imagenes_procesando += num_imagenes
-            self.estado = "procesando"
         
         try:
-            # Crear XML de respuesta fusionado
-            root_respuesta = ET.Element("imagenes_procesadas")
-            root_respuesta.set("total_procesadas", "0")
-            root_respuesta.set("total_errores", "0")
-            
-            xmls_temporales = []
-            nodos_procesados = []
-            
-            # Procesar cada imagen
-            for i, imagen_elem in enumerate(imagenes):
-                datos_b64 = imagen_elem.text
-                transformaciones = imagen_elem.get('transformaciones', '')
-                formato = imagen_elem.get('formato', 'JPEG')
-                
-                if not datos_b64:
-                    continue
-                
-                temp_xml = f"temp_batch_{int(time.time())}_{i}.xml"
-                xmls_temporales.append(temp_xml)
-                
-                try:
-                    # Crear XML temporal
-                    temp_root = ET.Element("imagenes")
-                    temp_imagen = ET.SubElement(temp_root, "imagen", {
-                        "formato": formato,
-                        "transformaciones": transformaciones
-                    })
-                    temp_imagen.text = datos_b64
-                    
-                    temp_tree = ET.ElementTree(temp_root)
-                    temp_tree.write(temp_xml, encoding="utf-8", xml_declaration=True)
-                    
-                    # Cargar con NodoOptimizado
-                    nodo = NodoOptimizado(temp_xml)
-                    
-                    if aplicar_transformaciones and transformaciones:
-                        # Aplicar transformaciones existentes
-                        trans_list = transformaciones.split(', ')
-                        for trans in trans_list:
-                            if 'escala_grises' in trans:
-                                nodo.escala_grises()
-                            elif 'rotar' in trans:
-                                angle = 45
-                                if '_' in trans:
-                                    try:
-                                        angle = int(trans.split('_')[-1].replace('Â°', ''))
-                                    except:
-                                        pass
-                                nodo.rotar(angle)
-                            elif 'redimensionar' in trans:
-                                if 'x' in trans:
-                                    try:
-                                        dims = trans.split('_')[1].split('x')
-                                        size = (int(dims[0]), int(dims[1]))
-                                        nodo.redimensionar(size)
-                                    except:
-                                        nodo.redimensionar()
-                            elif 'reflejar' in trans:
-                                direccion = trans.split('_')[1] if '_' in trans else 'horizontal'
-                                nodo.reflejar(direccion)
-                            elif 'desenfocar' in trans:
-                                radio = int(trans.split('_')[-1]) if '_' in trans else 2
-                                nodo.desenfocar(radio)
-                            elif 'perfilar' in trans:
-                                factor = float(trans.split('_')[-1]) if '_' in trans else 2.0
-                                nodo.perfilar(factor)
-                            elif 'ajustar_brillo' in trans:
-                                # parsear brillo_X_contraste_Y
-                                parts = trans.split('_')
-                                brillo = float(parts[2]) if len(parts) > 2 else 1.0
-                                contraste = float(parts[4]) if len(parts) > 4 else 1.0
-                                nodo.ajustar_brillo_contraste(brillo, contraste)
-                            elif 'insertar_texto' in trans:
-                                texto = trans.split('_', 2)[2] if '_' in trans else "Marca"
-                                nodo.insertar_texto(texto)
-                            elif 'convertir_a' in trans:
-                                formato = trans.split('_')[-1]
-                                nodo.convertir_formato(formato)
-                            elif 'recortar' in trans:
-                                # Necesitarías definir formato para box
-                                pass
-                    nodos_procesados.append(nodo)
-                    
-                except Exception as e:
-                    print(f"Error procesando imagen {i}: {e}")
-                    error_imagen = ET.SubElement(root_respuesta, "imagen")
-                    error_imagen.set("error", str(e))
-                    error_imagen.set("indice_original", str(i))
-            
-            # Fusionar todos los nodos procesados en un solo XML
+            # Respuesta fusionada como fragmentos serializados por imagen
+            fragmentos = []
             procesadas = 0
-            errores = int(root_respuesta.get("total_errores", "0"))
+            errores = 0
             
-            for j, nodo in enumerate(nodos_procesados):
-                try:
-                    temp_output = f"temp_output_batch_{int(time.time())}_{j}.xml"
-                    xmls_temporales.append(temp_output)
-                    
-                    nodo.generar_xml_optimizado(temp_output, "JPEG", calidad=80)
-                    
-                    # Leer y fusionar
-                    output_tree = ET.parse(temp_output)
-                    output_imagen = output_tree.getroot().find('imagen')
-                    
-                    if output_imagen is not None:
-                        nueva_imagen = ET.SubElement(root_respuesta, "imagen")
-                        nueva_imagen.attrib.update(output_imagen.attrib)
-                        nueva_imagen.set("indice_procesado", str(j))
-                        nueva_imagen.text = output_imagen.text
-                        procesadas += 1
-                        
-                except Exception as e:
-                    print(f"Error fusionando imagen {j}: {e}")
+            # Procesar cada imagen en paralelo. Las mÃ¡s grandes entran
+            # primero al pool (longest-first): con costos sesgados evita
+            # que una imagen pesada quede al final y marque la cola de
+            # latencia del batch. La respuesta conserva el orden original.
+            indices_por_peso = sorted(
+                range(num_imagenes),
+                key=lambda i: len(imagenes[i].text or ''),
+                reverse=True)
+            futuros = [None] * num_imagenes
+            for i in indices_por_peso:
+                futuros[i] = _POOL.submit(self._procesar_imagen_individual,
+                                          imagenes[i], i, aplicar_transformaciones)
+            for futuro in futuros:
+                resultado = futuro.result()
+                if resultado is None:
+                    continue
+                tipo, valor, _ = resultado
+                fragmentos.append(valor)
+                if tipo == "error":
                     errores += 1
+                else:
+                    procesadas += 1
             
-            # Actualizar contadores
-            root_respuesta.set("total_procesadas", str(procesadas))
-            root_respuesta.set("total_errores", str(errores))
-            
-            # Limpiar archivos temporales
-            for temp_file in xmls_temporales:
-                if os.path.exists(temp_file):
-                    try:
-                        os.remove(temp_file)
-                    except:
-                        pass
-            
-            return ET.tostring(root_respuesta, encoding='unicode')
-            
+            return b"".join(self._iter_respuesta_batch(fragmentos, procesadas, errores))
+
         except Exception as e:
             return self._crear_xml_error(f"Error general: {str(e)}")
         
         finally:
             with self.lock:
                 self.imagenes_procesando -= num_imagenes
-                if self.imagenes_procesando == 0:
-                    self.estado = "disponible"
     
+    def _procesar_imagen_individual(self, imagen_elem, indice, aplicar_transformaciones):
+        """
+        Procesa una imagen del batch (corre en el pool). Retorna:
+          ("cache", fragmento_bytes, None)  si hubo hit de cachÃ©,
+          ("ok", fragmento_bytes, clave)    si se procesÃ³ y codificÃ³,
+          ("error", fragmento_bytes, None)  si fallÃ³,
+          None                              si el elemento no trae datos.
+        """
+        datos_b64 = imagen_elem.text
+        transformaciones = imagen_elem.get('transformaciones', '')
+        formato = imagen_elem.get('formato', 'JPEG')
+        calidad = imagen_elem.get('calidad', '')
+        calidad = int(calidad) if calidad.isdigit() else 80
+        
+        if not datos_b64:
+            return None
+        
+        # Decodificar el base64 UNA sola vez: el str ASCII (~4/3 del tamaÃ±o
+        # real) no vuelve a tocarse; hash y carga trabajan sobre los bytes.
+        try:
+            datos_crudos = base64.b64decode(datos_b64, validate=False)
+        except Exception as e:
+            error_imagen = ET.Element("imagen")
+            error_imagen.set("error", f"base64 invÃ¡lido: {e}")
+            error_imagen.set("indice_original", str(indice))
+            return ("error", ET.tostring(error_imagen, encoding='utf-8'), None)
+        
+        clave = self._clave_cache(datos_crudos, transformaciones, formato, calidad)
+        resultado_cacheado = self._cache_obtener(clave)
+        if resultado_cacheado is not None:
+            return ("cache", self._fragmento_cacheado(resultado_cacheado, indice), None)
+        
+        # Un solo productor por clave: los duplicados del batch (reintentos
+        # del balanceador, collages) esperan y reusan el resultado
+        with self._cache_lock:
+            candado = self._claves_en_curso.setdefault(clave, threading.Lock())
+        try:
+            with candado:
+                resultado_cacheado = self._cache_obtener(clave)
+                if resultado_cacheado is not None:
+                    return ("cache",
+                            self._fragmento_cacheado(resultado_cacheado, indice),
+                            None)
+                try:
+                    # Cargar con NodoOptimizado directo desde memoria;
+                    # la envoltura gzip es opcional (magic bytes)
+                    if datos_crudos[:2] == b'\x1f\x8b':
+                        datos_crudos_img = _gzip_descomprimir_todo(datos_crudos)
+                    else:
+                        datos_crudos_img = datos_crudos
+                    nodo = NodoOptimizado.desde_bytes(datos_crudos_img)
+                    
+                    if aplicar_transformaciones and transformaciones:
+                        # Plan pre-compilado: sÃ³lo llamadas directas por imagen
+                        nodo.aplicar_plan(
+                            _compilar_transformaciones(transformaciones))
+                    
+                    atributos, b64_salida = nodo.generar_elemento_optimizado(
+                        formato, calidad=calidad)
+                    # Un solo dict fusionado: una operaciÃ³n de attrib por imagen
+                    texto_b64 = b64_salida.decode('ascii')
+                    nueva_imagen = ET.Element(
+                        "imagen", {**atributos, "indice_procesado": str(indice)})
+                    nueva_imagen.text = texto_b64
+                    self._cache_guardar(clave, atributos, texto_b64)
+                    return ("ok", ET.tostring(nueva_imagen, encoding='utf-8'), clave)
+                    
+                except Exception as e:
+                    log.debug("Error procesando imagen %d", indice, exc_info=True)
+                    error_imagen = ET.Element("imagen")
+                    error_imagen.set("error", str(e))
+                    error_imagen.set("indice_original", str(indice))
+                    return ("error", ET.tostring(error_imagen, encoding='utf-8'), None)
+        finally:
+            with self._cache_lock:
+                self._claves_en_curso.pop(clave, None)
+    
+    @staticmethod
+    def _fragmento_cacheado(resultado_cacheado, indice):
+        """Arma el fragmento <imagen> a partir de un hit de cachÃ©."""
+        atributos, texto = resultado_cacheado
+        imagen_cacheada = ET.Element(
+            "imagen", {**atributos, "indice_procesado": str(indice)})
+        imagen_cacheada.text = texto
+        return ET.tostring(imagen_cacheada, encoding='utf-8')
+    
+    @staticmethod
+    def _iter_respuesta_batch(fragmentos, procesadas, errores):
+        """
+        Genera la respuesta batch por partes: prÃ³logo, un fragmento
+        <imagen> por resultado y el cierre. Evita mantener el Ã¡rbol de
+        respuesta completo y su serializaciÃ³n gigante en memoria a la
+        vez, y deja el camino listo para streaming al cliente.
+        """
+        yield (b'<?xml version=\'1.0\' encoding=\'utf-8\'?>'
+               b'<imagenes_procesadas total_procesadas="%d" total_errores="%d">'
+               % (procesadas, errores))
+        yield from fragmentos
+        yield b'</imagenes_procesadas>'
+
     def procesar_xml_transformaciones(self, xml_content, transformaciones_extra=None):
         """
         Procesa XML aplicando transformaciones especÃ­ficas.
@@ -247,6 +391,8 @@ class GestorNodos:
         Convierte una sola imagen y la devuelve.
         """
         try:
+            if isinstance(xml_content, str):
+                xml_content = xml_content.encode('utf-8')
             root = ET.fromstring(xml_content)
             imagenes = root.findall('imagen')
             
@@ -263,88 +409,81 @@ class GestorNodos:
                 if self.imagenes_procesando >= self.capacidad_maxima:
                     return self._crear_xml_error("Capacidad mÃ¡xima excedida")
                 self.imagenes_procesando += 1
-                self.estado = "procesando"
-            
-            temp_xml = f"temp_single_{int(time.time())}.xml"
-            temp_output = f"temp_single_out_{int(time.time())}.xml"
             
             try:
-                # Crear XML temporal
-                temp_root = ET.Element("imagenes")
-                temp_imagen = ET.SubElement(temp_root, "imagen", {
-                    "formato": imagen_elem.get('formato', 'JPEG')
-                })
-                temp_imagen.text = datos_b64
-                
-                temp_tree = ET.ElementTree(temp_root)
-                temp_tree.write(temp_xml, encoding="utf-8", xml_declaration=True)
-                
-                # Procesar
-                nodo = NodoOptimizado(temp_xml)
-                nodo.generar_xml_optimizado(temp_output, formato_salida, calidad)
+                # Todo en memoria: decodificar, convertir y armar la
+                # respuesta sin archivo temporal ni re-parseo del XML
+                nodo = NodoOptimizado.desde_b64(datos_b64)
+                atributos, b64_salida = nodo.generar_elemento_optimizado(
+                    formato_salida, calidad)
                 
-                # Leer resultado
-                output_tree = ET.parse(temp_output)
-                output_imagen = output_tree.getroot().find('imagen')
-                
-                # Crear respuesta
                 root_respuesta = ET.Element("imagen_convertida")
-                nueva_imagen = ET.SubElement(root_respuesta, "imagen")
-                nueva_imagen.attrib.update(output_imagen.attrib)
-                nueva_imagen.text = output_imagen.text
-                
-                # Limpiar
-                for temp_file in [temp_xml, temp_output]:
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
-                
-                return ET.tostring(root_respuesta, encoding='unicode')
+                nueva_imagen = ET.SubElement(root_respuesta, "imagen",
+                                             dict(atributos))
+                nueva_imagen.text = b64_salida.decode('ascii')
                 
+                return ET.tostring(root_respuesta, encoding='utf-8', xml_declaration=True)
+
             except Exception as e:
                 return self._crear_xml_error(f"Error convertiendo: {str(e)}")
             
             finally:
                 with self.lock:
                     self.imagenes_procesando -= 1
-                    if self.imagenes_procesando == 0:
-                        self.estado = "disponible"
                         
         except Exception as e:
             return self._crear_xml_error(f"Error procesando XML: {str(e)}")
     
     def obtener_estado(self):
-        """Retorna el estado actual del gestor."""
-        with self.lock:
-            return {
-                "estado": self.estado,
-                "imagenes_procesando": self.imagenes_procesando,
-                "capacidad_maxima": self.capacidad_maxima,
-                "capacidad_disponible": self.capacidad_maxima - self.imagenes_procesando,
-                "disponible": self.imagenes_procesando < self.capacidad_maxima
-            }
+        """
+        Retorna el estado actual del gestor.
+        Lee el contador sin tomar el lock: la lectura de un int es atÃ³mica
+        en CPython, asÃ­ que los health-checks no compiten con el
+        procesamiento en curso.
+        """
+        procesando = self.imagenes_procesando
+        return {
+            "estado": "procesando" if procesando > 0 else "disponible",
+            "imagenes_procesando": procesando,
+            "capacidad_maxima": self.capacidad_maxima,
+            "capacidad_disponible": self.capacidad_maxima - procesando,
+            "disponible": procesando < self.capacidad_maxima
+        }
     
     def _crear_xml_error(self, mensaje_error):
-        """Crea un XML de respuesta con error."""
+        """Crea un XML de respuesta con error (bytes UTF-8, sin re-codificar)."""
         root = ET.Element("error")
         root.text = mensaje_error
-        return ET.tostring(root, encoding='unicode')
+        return ET.tostring(root, encoding='utf-8')
 
 
 class RPCNodoService:
     """Servicio RPC para el nodo"""
     def __init__(self, gestor):
         self.gestor = gestor
-    
+
     def ping(self):
         """RPC method para verificar conectividad"""
         return "pong"
-    
+
+    @staticmethod
+    def _contenido_xml(xml_content):
+        """
+        Normaliza el payload RPC a bytes/str sin copias extra.
+        Los clientes pueden mandar `xmlrpc.client.Binary` para evitar
+        la decodificaciÃ³n UTF-8 del cuerpo completo.
+        """
+        if isinstance(xml_content, xmlrpc.client.Binary):
+            return xml_content.data
+        return xml_content
+
     def procesar_imagenes(self, xml_content):
         """RPC method para procesamiento batch de imÃ¡genes"""
         try:
+            xml_content = self._contenido_xml(xml_content)
             estado = self.gestor.obtener_estado()
             if not estado["disponible"]:
-                return json.dumps({
+                return _json_dumps({
                     "success": False,
                     "error": "Servidor saturado, intente mÃ¡s tarde"
                 })
@@ -352,18 +491,18 @@ class RPCNodoService:
             resultado = self.gestor.procesar_xml_imagenes(xml_content)
             
             # Verificar si es error
-            if resultado.startswith("<error>"):
-                return json.dumps({
+            if resultado.startswith(b"<error>"):
+                return _json_dumps({
                     "success": False,
-                    "error": resultado
+                    "error": resultado.decode('utf-8')
                 })
             
-            return json.dumps({
+            return _json_dumps({
                 "success": True,
-                "xml_result": resultado
+                "xml_result": resultado.decode('utf-8')
             })
         except Exception as e:
-            return json.dumps({
+            return _json_dumps({
                 "success": False,
                 "error": f"Error del servidor: {str(e)}"
             })
@@ -371,9 +510,10 @@ class RPCNodoService:
     def transformar_imagenes(self, xml_content):
         """RPC method para transformaciones batch de imÃ¡genes"""
         try:
+            xml_content = self._contenido_xml(xml_content)
             estado = self.gestor.obtener_estado()
             if not estado["disponible"]:
-                return json.dumps({
+                return _json_dumps({
                     "success": False,
                     "error": "Servidor saturado, intente mÃ¡s tarde"
                 })
@@ -381,18 +521,18 @@ class RPCNodoService:
             resultado = self.gestor.procesar_xml_transformaciones(xml_content)
             
             # Verificar si es error
-            if resultado.startswith("<error>"):
-                return json.dumps({
+            if resultado.startswith(b"<error>"):
+                return _json_dumps({
                     "success": False,
-                    "error": resultado
+                    "error": resultado.decode('utf-8')
                 })
             
-            return json.dumps({
+            return _json_dumps({
                 "success": True,
-                "xml_result": resultado
+                "xml_result": resultado.decode('utf-8')
             })
         except Exception as e:
-            return json.dumps({
+            return _json_dumps({
                 "success": False,
                 "error": f"Error del servidor: {str(e)}"
             })
@@ -400,9 +540,10 @@ class RPCNodoService:
     def convertir_imagen_unica(self, xml_content, formato_salida="JPEG", calidad=85):
         """RPC method para conversiÃ³n de imagen Ãºnica"""
         try:
+            xml_content = self._contenido_xml(xml_content)
             # Validar formato
             if formato_salida.upper() not in ['JPEG', 'PNG', 'WEBP']:
-                return json.dumps({
+                return _json_dumps({
                     "success": False,
                     "error": "Formato no soportado. Use: JPEG, PNG, WEBP"
                 })
@@ -410,18 +551,18 @@ class RPCNodoService:
             resultado = self.gestor.convertir_imagen_unica(xml_content, formato_salida, calidad)
             
             # Verificar si es error
-            if resultado.startswith("<error>"):
-                return json.dumps({
+            if resultado.startswith(b"<error>"):
+                return _json_dumps({
                     "success": False,
-                    "error": resultado
+                    "error": resultado.decode('utf-8')
                 })
             
-            return json.dumps({
+            return _json_dumps({
                 "success": True,
-                "xml_result": resultado
+                "xml_result": resultado.decode('utf-8')
             })
         except Exception as e:
-            return json.dumps({
+            return _json_dumps({
                 "success": False,
                 "error": f"Error del servidor: {str(e)}"
             })
@@ -430,9 +571,9 @@ class RPCNodoService:
         """RPC method para obtener estado del nodo"""
         try:
             estado = self.gestor.obtener_estado()
-            return json.dumps(estado)
+            return _json_dumps(estado)
         except Exception as e:
-            return json.dumps({
+            return _json_dumps({
                 "error": f"Error al obtener estado: {str(e)}"
             })
 
@@ -458,7 +599,7 @@ def registrar_nodo_en_balanceador_rpc(ip_nodo):
         balanceador_client = xmlrpc.client.ServerProxy(BALANCEADOR_RPC_URL)
         
         # Registrar nodo
-        resultado = balanceador_client.registrar_nodo(json.dumps(datos_registro))
+        resultado = balanceador_client.registrar_nodo(_json_dumps(datos_registro))
         
         if resultado:
             print(f"âœ… Nodo registrado exitosamente en balanceador: {ip_nodo}")
@@ -489,41 +630,45 @@ def iniciar_servidor_rpc_nodo(ip, puerto=9000):
 # Instancia global del gestor
 gestor = GestorNodos()
 
-# Crear aplicación Flask para el endpoint REST de estado (opcional)
-app = Flask(__name__)
-CORS(app, origins="*", allow_headers=["Content-Type", "Authorization"], methods=["GET", "POST", "OPTIONS"])
-
-@app.route('/estado', methods=['GET'])
-def consultar_estado():
-    """Endpoint REST opcional para consulta de estado"""
-    try:
-        estado = gestor.obtener_estado()
-        return jsonify(estado)
-    except Exception as e:
-        return jsonify({
-            "error": f"Error al obtener estado: {str(e)}"
-        }), 500
-
-@app.route('/salud', methods=['GET'])
-def check_health():
-    """Health check REST opcional"""
-    return jsonify({
-        "status": "healthy",
-        "service": "Gestor de Nodos RPC de Imagen",
-        "timestamp": time.time()
-    })
+# App Flask compartida para los endpoints REST de estado (opcional)
+app = crear_app(gestor)
 
 
 def ejecutar_servidor_rest(app, puerto, ip_local):
     """Ejecuta servidor REST opcional."""
     try:
-        server = make_server(ip_local, puerto, app)
+        server = make_server(ip_local, puerto, app, threaded=True)
         print(f"âœ… Servidor REST opcional iniciado en {ip_local}:{puerto}")
         server.serve_forever()
     except Exception as e:
         print(f"âŒ Error iniciando servidor REST: {e}")
 
 
+def warmup():
+    """
+    Precalienta PIL antes de servir: la primera aperturaÂ de imagen y el
+    primer encode de cada formato cargan plugins y tablas JPEG de forma
+    perezosa, y sin esto lo paga el primer cliente RPC.
+    """
+    try:
+        from PIL import Image
+        buf = io.BytesIO()
+        Image.new('RGB', (16, 16), 'white').save(buf, 'PNG')
+        nodo = NodoOptimizado.desde_bytes(buf.getvalue())
+        (nodo.redimensionar((8, 8)).rotar(45).reflejar('horizontal')
+             .desenfocar(1).perfilar(1.5).ajustar_brillo_contraste(1.1, 1.1)
+             .insertar_texto("w").escala_grises())
+        for formato in ('JPEG', 'PNG', 'WEBP'):
+            try:
+                salida = io.BytesIO()
+                nodo.imagen_procesada.convert('RGB').save(salida, formato)
+            except Exception:
+                pass  # formato sin plugin disponible
+        print("âš¡ Warmup de PIL completado")
+    except Exception as e:
+        log.debug("Warmup fallÃ³: %s", e, exc_info=True)
+
+
 def main():
     """FunciÃ³n principal que inicia el nodo RPC."""
     print("ðŸš€ Iniciando Nodo RPC de Imagen...")
@@ -542,6 +687,9 @@ def main():
     )
     servidor_rpc.start()
     
+    # Precalentar PIL para que el primer request no pague el cold start
+    warmup()
+    
     # Esperar un momento para que el servidor RPC inicie
     time.sleep(2)
     
@@ -585,4 +733,5 @@ def main():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
     main()
\ No newline at end of file
@@ -1,10 +1,18 @@
+import atexit
+import functools
 import os
 import threading
 import time
-from flask import Flask, request, jsonify
-from flask_cors import CORS
 from werkzeug.serving import make_server
-import xml.etree.ElementTree as ET
+from rest import crear_app
+# lxml (libxml2, C) parsea y serializa XML 2-5x más rápido que el
+# ElementTree de la stdlib; si no está instalado se usa stdlib
+try:
+    from lxml import etree as ET
+    _ES_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    _ES_LXML = False
 from objects2 import NodoOptimizado
 import socket
 import subprocess
@@ -12,13 +20,168 @@ import re
 import json
 import xmlrpc.server
 import xmlrpc.client
-from socketserver import ThreadingMixIn
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import multiprocessing as mp
 import io
 import base64
+import binascii
 import gzip
+import zlib
 from PIL import Image
 
+# pybase64 decodifica base64 con SIMD (SSSE3/AVX2), ~4-10x sobre
+# binascii en payloads de cientos de KB; opcional, misma API
+try:
+    import pybase64
+    _a2b_base64 = pybase64.b64decode
+except ImportError:
+    _a2b_base64 = binascii.a2b_base64
+
+# libjpeg-turbo decodifica JPEG soltando el GIL por completo, así los
+# hilos del pool escalan casi lineal en el decode; opcional
+try:
+    import numpy as _np
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _TURBO_JPEG = TurboJPEG()
+except Exception:
+    _TURBO_JPEG = None
+
+# msgpack: framing binario puro-C para los endpoints *_msgpack; opcional
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# zstandard descomprime varias veces más rápido que DEFLATE; opcional
+try:
+    import zstandard
+    _ZSTD_DESCOMPRESOR = zstandard.ZstdDecompressor()
+except ImportError:
+    _ZSTD_DESCOMPRESOR = None
+
+# Pool persistente de workers de imagen: crear un ThreadPoolExecutor por
+# batch pagaba el spawn de hilos en cada request; uno global lo amortiza
+# y satura mejor el CPU en trabajo de decode/transform
+_POOL = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('NODO_IMG_WORKERS', 0))
+    or max(4, os.cpu_count() or 4),
+    thread_name_prefix='img')
+atexit.register(_POOL.shutdown, wait=False)
+
+# Pool de la etapa de decodificación (base64+gzip+PIL.open liberan el GIL
+# en sus tramos C); separado del de transformación para encadenar ambas
+# etapas en pipeline
+_DECODE_POOL = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('NODO_DECODE_WORKERS', 0))
+    or max(4, os.cpu_count() or 4),
+    thread_name_prefix='dec')
+atexit.register(_DECODE_POOL.shutdown, wait=False)
+
+# Pool de procesos opcional (NODO_POOL=procesos): escapa del GIL cuando
+# el batch trae muchas imágenes chicas y el despacho Python domina sobre
+# el trabajo C de PIL. Sólo cruzan bytes/str la frontera, nunca PIL
+if os.environ.get('NODO_POOL') == 'procesos' and hasattr(os, 'fork'):
+    _PPOOL = ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                 mp_context=mp.get_context('fork'))
+else:
+    _PPOOL = None
+
+
+def _procesar_imagen_proceso(datos_b64, transformaciones, formato, calidad,
+                             aplicar_transformaciones):
+    """
+    Worker picklable para el pool de procesos. Devuelve
+    (b64_data, transformaciones_aplicadas, total, compresion, error).
+    """
+    try:
+        datos_imagen = _descomprimir_payload(_a2b_base64(datos_b64))
+        img = _abrir_imagen(datos_imagen)
+        
+        nodo = NodoOptimizado()
+        nodo.imagen_original = img
+        nodo.imagen_procesada = img.copy()
+        
+        if aplicar_transformaciones and transformaciones:
+            gestor._aplicar_transformaciones_optimizado(nodo, transformaciones)
+        
+        b64_data = nodo.convertir_y_comprimir_optimizado(formato, calidad)
+        return (b64_data, ", ".join(nodo.transformaciones_aplicadas),
+                len(nodo.transformaciones_aplicadas), nodo.compresion_salida,
+                None)
+    except Exception as e:
+        return None, None, 0, None, str(e)
+
+
+# Estado reutilizable por hilo: copiar un decompressobj ya construido es
+# más barato que crear uno nuevo, y un solo BytesIO por worker evita un
+# buffer fresco (y su recolección) por imagen
+_TLS = threading.local()
+
+
+def _gzip_descomprimir(datos):
+    plantilla = getattr(_TLS, 'descompresor', None)
+    if plantilla is None:
+        plantilla = _TLS.descompresor = zlib.decompressobj(31)  # 31 = con wrapper gzip
+    d = plantilla.copy()
+    return d.decompress(datos) + d.flush()
+
+
+def _parse_xml(contenido):
+    """
+    Parsea el XML de entrada. Con lxml reutiliza un parser por hilo
+    (construir el parser C por request tiene costo fijo); el parser de
+    la stdlib es de un solo uso, así que ahí no hay nada que reutilizar.
+    """
+    if isinstance(contenido, str):
+        # lxml no acepta str con declaración de encoding
+        contenido = contenido.encode('utf-8')
+    if _ES_LXML:
+        parser = getattr(_TLS, 'xml_parser', None)
+        if parser is None:
+            parser = _TLS.xml_parser = ET.XMLParser(huge_tree=False)
+        return ET.fromstring(contenido, parser)
+    return ET.fromstring(contenido)
+
+
+def _abrir_imagen(datos_imagen):
+    if _TURBO_JPEG is not None and datos_imagen[:3] == b'\xff\xd8\xff':
+        try:
+            # decode C puro sin GIL; pedir RGB evita el swap BGR posterior
+            return Image.fromarray(_TURBO_JPEG.decode(datos_imagen,
+                                                      pixel_format=TJPF_RGB))
+        except Exception:
+            pass  # JPEG raro (CMYK, progresivo truncado): que lo abra PIL
+    bio = getattr(_TLS, 'bio', None)
+    if bio is None:
+        bio = _TLS.bio = io.BytesIO()
+    bio.seek(0)
+    bio.truncate()
+    bio.write(datos_imagen)
+    bio.seek(0)
+    img = Image.open(bio)
+    img.load()  # decodificar ya: el buffer se reutiliza con la siguiente imagen
+    if img.mode not in ('RGB', 'RGBA', 'L'):
+        # Normalizar P/CMYK/etc. una sola vez aquí, en lugar de pagar la
+        # reconversión en cada transformación y otra vez al codificar
+        img = img.convert('RGB')
+    return img
+
+
+def _descomprimir_payload(datos):
+    """
+    Devuelve los bytes de imagen según los magic bytes del payload:
+    JPEG/PNG/WEBP llegan ya comprimidos y pasan directo (gzip sobre ellos
+    no gana nada), gzip y zstd se descomprimen con su códec.
+    """
+    if datos[:3] == b'\xff\xd8\xff' or datos[:4] == b'\x89PNG' or datos[:4] == b'RIFF':
+        return datos
+    if datos[:2] == b'\x1f\x8b':
+        return _gzip_descomprimir(datos)
+    if datos[:4] == b'\x28\xb5\x2f\xfd' and _ZSTD_DESCOMPRESOR is not None:
+        return _ZSTD_DESCOMPRESOR.decompress(datos)
+    return datos
+
+@functools.lru_cache(maxsize=1)
 def obtener_ip_real():
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
@@ -60,22 +223,69 @@ def obtener_ip_real():
 BALANCEADOR_IP = "192.168.154.129"
 BALANCEADOR_RPC_URL = f"http://{BALANCEADOR_IP}:8000"
 
-class ThreadedXMLRPCServer(ThreadingMixIn, xmlrpc.server.SimpleXMLRPCServer):
-    pass
+class KeepAliveRequestHandler(xmlrpc.server.SimpleXMLRPCRequestHandler):
+    """
+    Handler HTTP/1.1: las conexiones del balanceador se reutilizan entre
+    llamadas en lugar de pagar handshake TCP por request.
+    """
+    protocol_version = 'HTTP/1.1'
+
+
+class ThreadedXMLRPCServer(xmlrpc.server.SimpleXMLRPCServer):
+    """
+    Servidor XML-RPC respaldado por un pool de hilos fijo, en lugar del
+    hilo-por-request sin límite de ThreadingMixIn. Bajo ráfagas evita el
+    costo de crear hilos de kernel y el thrashing de context switches.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+    _executor = ThreadPoolExecutor(max_workers=2 * (os.cpu_count() or 4),
+                                   thread_name_prefix='rpc')
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._procesar_request, request, client_address)
+
+    def _procesar_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+class NodoError(Exception):
+    """Fallo de procesamiento reportable al cliente: viaja como
+    excepción hasta la frontera RPC, sin materializar XML de error."""
+
 
 class GestorNodos:
     def __init__(self):
         self.capacidad_maxima = 100000
         self.estado = "disponible"
         self.imagenes_procesando = 0
+        # Un contador bajo un lock corto reserva el lote entero en una
+        # sola operación; el semáforo de Python no soporta acquire(n) y
+        # obligaba a N acquires por request.
         self.lock = threading.Lock()
     
-    def _crear_xml_error(self, mensaje_error):
-        root = ET.Element("error")
-        root.text = mensaje_error
-        return ET.tostring(root, encoding='unicode')
+    def _adquirir_capacidad(self, cantidad):
+        """Reserva `cantidad` cupos sin bloquear; False si no alcanzan."""
+        with self.lock:
+            if self.imagenes_procesando + cantidad > self.capacidad_maxima:
+                return False
+            self.imagenes_procesando += cantidad
+            self.estado = "procesando"
+        return True
     
-    def _procesar_imagen_individual_optimizado(self, imagen_elem, indice, aplicar_transformaciones):
+    def _liberar_capacidad(self, cantidad):
+        with self.lock:
+            self.imagenes_procesando -= cantidad
+            if self.imagenes_procesando == 0:
+                self.estado = "disponible"
+    
+    def _decodificar_elemento(self, imagen_elem, indice):
+        """Etapa 1: base64 + descompresión + decode PIL."""
         try:
             datos_b64 = imagen_elem.text.strip() if imagen_elem.text else ""
             transformaciones = imagen_elem.get('transformaciones', '')
@@ -83,236 +293,322 @@ class GestorNodos:
             calidad = int(imagen_elem.get('calidad', '85'))
             
             if not datos_b64:
-                return None, f"Sin datos en imagen {indice}", None, None
-            
-            try:
-                datos_comprimidos = base64.b64decode(datos_b64)
-                datos_imagen = gzip.decompress(datos_comprimidos)
-            except:
-                datos_imagen = base64.b64decode(datos_b64)
+                return None, f"Sin datos en imagen {indice}", None, None, None
             
-            img = Image.open(io.BytesIO(datos_imagen))
-            
-            nodo = NodoOptimizado()
-            nodo.imagen_original = img
-            nodo.imagen_procesada = img.copy()
-            
-            if aplicar_transformaciones and transformaciones:
-                self._aplicar_transformaciones_optimizado(nodo, transformaciones)
+            # a2b_base64 directo: evita la validación y copia extra que
+            # envuelve base64.b64decode en el loop por imagen
+            datos_imagen = _descomprimir_payload(_a2b_base64(datos_b64))
             
+            img = _abrir_imagen(datos_imagen)
+            return img, None, transformaciones, formato_original, calidad
+        except Exception as e:
+            return None, str(e), None, None, None
+    
+    def _transformar_imagen(self, img, transformaciones, aplicar_transformaciones):
+        """Etapa 2: cadena de transformaciones sobre la imagen decodificada."""
+        nodo = NodoOptimizado()
+        nodo.imagen_original = img
+        # Las transformaciones PIL devuelven imágenes nuevas y la única
+        # que muta en sitio (insertar_texto) copia de forma perezosa
+        nodo.imagen_procesada = img
+        if aplicar_transformaciones and transformaciones:
+            self._aplicar_transformaciones_optimizado(nodo, transformaciones)
+        return nodo
+    
+    def _transformar_y_fragmentar(self, img, transformaciones,
+                                  aplicar_transformaciones, indice,
+                                  formato_salida, calidad):
+        """
+        Etapa 2 fusionada: transforma, codifica y serializa el fragmento
+        en el mismo worker, así el encode de una imagen corre en paralelo
+        con las transformaciones de las demás en vez de en serie al final.
+        """
+        nodo = self._transformar_imagen(img, transformaciones,
+                                        aplicar_transformaciones)
+        return self._fusionar_nodo_a_fragmento(nodo, indice,
+                                               formato_salida, calidad)
+    
+    def _procesar_imagen_individual_optimizado(self, imagen_elem, indice, aplicar_transformaciones):
+        img, error, transformaciones, formato_original, calidad = \
+            self._decodificar_elemento(imagen_elem, indice)
+        if error:
+            return None, error, None, None
+        try:
+            nodo = self._transformar_imagen(img, transformaciones,
+                                            aplicar_transformaciones)
             return nodo, None, formato_original, calidad
-            
         except Exception as e:
             return None, str(e), None, None
     
-    def _aplicar_transformaciones_optimizado(self, nodo, transformaciones_str):
-        trans_list = transformaciones_str.split(', ')
-        
-        # IMPRIME TRANSFORMACIONES A APLICAR
-        print(f"\n🔧 Procesando transformaciones: {transformaciones_str}")
-        print(f"   Total a aplicar: {len(trans_list)}")
-        for idx, t in enumerate(trans_list, 1):
-            print(f"   [{idx}] {t}")
-        ajustes_color = []
-        geometricas = []
-        efectos = []
-        otros = []
-        
-        for trans in trans_list:
-            if any(x in trans for x in ['escala_grises', 'ajustar_brillo', 'ajustar_saturacion', 'ajustar_nitidez']):
-                ajustes_color.append(trans)
-            elif any(x in trans for x in ['rotar', 'redimensionar', 'reflejar', 'recortar']):
-                geometricas.append(trans)
-            elif any(x in trans for x in ['desenfocar', 'perfilar']):
-                efectos.append(trans)
-            else:
-                otros.append(trans)
-        
-        for trans in ajustes_color + geometricas + efectos + otros:
+    # Un solo regex (DFA) tokeniza operación + parámetros en una pasada,
+    # en vez de 9+ escaneos `in` y splits repetidos por transformación
+    _TRANS_RE = re.compile(
+        r'(?P<op>escala_grises|ajustar_brillo|ajustar_saturacion|ajustar_nitidez|'
+        r'redimensionar|recortar|reflejar|rotar|desenfocar|perfilar|insertar_texto)'
+        r'(?:_(?P<args>.+))?$')
+    
+    # Tablas precalculadas nivel (0-100) -> parámetro ya escalado y
+    # acotado: indexar reemplaza la división flotante + dos clamps
+    _MAPA_RADIO = tuple(max(0.1, min(10.0, v / 10.0)) for v in range(101))
+    _MAPA_FACTOR = tuple(max(0.0, min(3.0, v / 33.33)) for v in range(101))
+    _MAPA_NIVEL_50 = tuple(max(0.1, min(2.0, v / 50.0)) for v in range(101))
+    
+    # Mismo orden de aplicación que los buckets originales:
+    # color (0) -> geométricas (1) -> efectos (2)
+    _ORDEN_TRANS = {
+        'escala_grises': 0, 'ajustar_brillo': 0,
+        'ajustar_saturacion': 0, 'ajustar_nitidez': 0,
+        'rotar': 1, 'redimensionar': 1, 'reflejar': 1, 'recortar': 1,
+        'desenfocar': 2, 'perfilar': 2,
+        'insertar_texto': 3,
+    }
+    
+    @staticmethod
+    def _parse_rotar(cola):
+        try:
+            return ('rotar', (int(cola.split('_')[-1]),))
+        except (ValueError, IndexError):
+            return ('rotar', (45,))
+    
+    @staticmethod
+    def _parse_redimensionar(cola):
+        if 'sin_cambio' in cola:
+            return None
+        if 'x' in cola:
             try:
-                if 'escala_grises' in trans:
-                    nodo.escala_grises()
-                    
-                elif 'rotar' in trans:
-                    try:
-                        angle = int(trans.split('_')[-1])
-                    except:
-                        angle = 45
-                    nodo.rotar(angle)
-                    
-                elif 'redimensionar' in trans:
-                    if 'sin_cambio' in trans:
-                        continue
-                    if 'x' in trans:
-                        try:
-                            dims = trans.split('_')[1].split('x')
-                            size = (int(dims[0]), int(dims[1]))
-                            if size != nodo.imagen_procesada.size:
-                                nodo.redimensionar(size)
-                        except:
-                            pass
+                dims = cola.split('_')[0].split('x')
+                return ('redimensionar', ((int(dims[0]), int(dims[1])),))
+            except (ValueError, IndexError):
+                return None
+        return ('redimensionar', ((200, 200),))
+    
+    @staticmethod
+    def _parse_recortar(cola):
+        try:
+            partes = cola.split('_')
+            if len(partes) >= 4:
+                return ('recortar', ((int(partes[0]), int(partes[1]),
+                                      int(partes[2]), int(partes[3])),))
+        except ValueError:
+            pass
+        return ('recortar', ())
+    
+    @staticmethod
+    def _parse_reflejar(cola):
+        return ('reflejar', (cola.split('_')[0] if cola else 'horizontal',))
+    
+    @classmethod
+    def _parse_desenfocar(cls, cola):
+        try:
+            radio = cls._MAPA_RADIO[max(0, min(100, int(cola.split('_')[-1])))]
+        except (ValueError, IndexError):
+            radio = 2.0
+        return ('desenfocar', (radio,))
+    
+    @classmethod
+    def _parse_perfilar(cls, cola):
+        try:
+            factor = cls._MAPA_FACTOR[max(0, min(100, int(cola.split('_')[-1])))]
+        except (ValueError, IndexError):
+            factor = 2.0
+        return ('perfilar', (factor,))
+    
+    @classmethod
+    def _parse_ajustar_brillo(cls, cola):
+        # cola = "NN_contraste_MM"
+        partes = cola.split('_')
+        try:
+            brillo_val = max(0, min(100, int(partes[0]) if partes and partes[0] else 50))
+            contraste_val = max(0, min(100, int(partes[2]) if len(partes) > 2 else 50))
+            brillo = cls._MAPA_NIVEL_50[brillo_val]
+            contraste = cls._MAPA_NIVEL_50[contraste_val]
+        except (ValueError, IndexError):
+            brillo = contraste = 1.0
+        return ('ajustar_brillo_contraste', (brillo, contraste))
+    
+    @staticmethod
+    def _parse_nivel_100(nombre, cola):
+        try:
+            nivel = max(0, min(100, int(cola.split('_')[-1])))
+        except (ValueError, IndexError):
+            nivel = 50
+        return (nombre, (nivel,))
+    
+    @staticmethod
+    def _parse_insertar_texto(cola):
+        partes = cola.split('_') if cola else []
+        texto = "Marca"
+        posicion = (10, 10)
+        tamaño_fuente = None
+        if len(partes) >= 1 and cola:
+            try:
+                pos_idx = partes.index('pos')
+                tam_idx = partes.index('tam') if 'tam' in partes else -1
+                posicion = (int(partes[pos_idx + 1]), int(partes[pos_idx + 2]))
+                if tam_idx != -1:
+                    tamaño_fuente = int(partes[tam_idx + 1])
+                fin_texto = pos_idx if tam_idx == -1 or tam_idx > pos_idx else tam_idx
+                texto = '_'.join(partes[:fin_texto])
+            except (ValueError, IndexError):
+                texto = '_'.join(partes[:-3]) if len(partes) > 3 else '_'.join(partes[:-2])
+                try:
+                    if len(partes) > 2:
+                        tamaño_fuente = int(partes[-1]) if 'tam' in partes else None
+                        posicion = (int(partes[-3]), int(partes[-2]))
                     else:
-                        if (200, 200) != nodo.imagen_procesada.size:
-                            nodo.redimensionar()
-                        
-                elif 'recortar' in trans:
-                    try:
-                        parts = trans.split('_')
-                        if len(parts) >= 5:
-                            box = (int(parts[1]), int(parts[2]), int(parts[3]), int(parts[4]))
-                            nodo.recortar(box)
-                        else:
-                            nodo.recortar()
-                    except:
-                        nodo.recortar()
-                        
-                elif 'reflejar' in trans:
-                    direccion = trans.split('_')[1] if len(trans.split('_')) > 1 else 'horizontal'
-                    nodo.reflejar(direccion)
-                    
-                elif 'desenfocar' in trans:
-                    try:
-                        valor = int(trans.split('_')[-1])
-                        valor = max(0, min(100, valor))  # FIX: Estandarizado a 0-100
-                        radio = max(0.1, min(10.0, valor / 10.0))  # FIX: Clamp min 0.1 para efecto visible; 100 -> 10.0 max
-                    except:
-                        radio = 2.0
-                    nodo.desenfocar(radio)
-                    
-                elif 'perfilar' in trans:
-                    try:
-                        valor = int(trans.split('_')[-1])
-                        valor = max(0, min(100, valor))  # FIX: Estandarizado a 0-100
-                        factor = max(0.0, min(3.0, valor / 33.33))
-                    except:
-                        factor = 2.0
-                    nodo.perfilar(factor)
-                    
-                elif 'ajustar_brillo' in trans:
-                    parts = trans.split('_')
-                    try:
-                        brillo_val = int(parts[2]) if len(parts) > 2 else 50
-                        contraste_val = int(parts[4]) if len(parts) > 4 else 50
-                        brillo_val = max(0, min(100, brillo_val))  # FIX: Clamp 0-100
-                        contraste_val = max(0, min(100, contraste_val))
-                        brillo = max(0.1, min(2.0, brillo_val / 50.0))  # FIX: Clamp min 0.1 para evitar negro; 50->1.0
-                        contraste = max(0.1, min(2.0, contraste_val / 50.0))
-                    except:
-                        brillo = 1.0
-                        contraste = 1.0
-                    nodo.ajustar_brillo_contraste(brillo, contraste)
-                    
-                elif 'ajustar_nitidez' in trans:
-                    try:
-                        nivel = int(trans.split('_')[-1])
-                        nivel = max(0, min(100, nivel))  # FIX: Cambiado a 0-100
-                    except:
-                        nivel = 50
-                    nodo.ajustar_nitidez(nivel)
-                    
-                elif 'ajustar_saturacion' in trans:
-                    try:
-                        nivel = int(trans.split('_')[-1])
-                        nivel = max(0, min(100, nivel))  # FIX: Cambiado a 0-100
-                    except:
-                        nivel = 50
-                    nodo.ajustar_saturacion(nivel)
-                    
-                elif 'insertar_texto' in trans:
-                    parts = trans.split('_')
-                    texto = "Marca"
+                        posicion = (10, 10)
+                except (ValueError, IndexError):
                     posicion = (10, 10)
-                    tamaño_fuente = None  # FIX: Ahora parseamos tam
-                    if len(parts) < 3:
-                        pass
-                    else:
-                        try:
-                            pos_idx = parts.index('pos')
-                            tam_idx = parts.index('tam') if 'tam' in parts else -1
-                            x = int(parts[pos_idx + 1])
-                            y = int(parts[pos_idx + 2])
-                            posicion = (x, y)
-                            if tam_idx != -1:
-                                tamaño_fuente = int(parts[tam_idx + 1])
-                            texto_start = 2  # 'insertar_texto_'
-                            texto_end = pos_idx if tam_idx == -1 or tam_idx > pos_idx else tam_idx
-                            texto = '_'.join(parts[texto_start:texto_end])
-                        except:
-                            texto = '_'.join(parts[2:-3]) if len(parts) > 5 else '_'.join(parts[2:-2])  # FIX: Ajuste para tam
-                            try:
-                                if len(parts) > 4:
-                                    tamaño_fuente = int(parts[-1]) if 'tam' in parts else None
-                                    x = int(parts[-3])
-                                    y = int(parts[-2])
-                                else:
-                                    x = int(parts[-2])
-                                    y = int(parts[-1])
-                                posicion = (x, y)
-                            except:
-                                posicion = (10, 10)
-                    nodo.insertar_texto(texto, posicion=posicion, tamaño_fuente=tamaño_fuente)
-                    
+        return ('insertar_texto', (texto,), {'posicion': posicion,
+                                             'tamaño_fuente': tamaño_fuente})
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _compilar_plan(transformaciones_str):
+        """
+        Parsea y ordena la cadena una sola vez por cadena única. En un
+        fan-out del balanceador todas las imágenes del lote traen la
+        misma cadena, así que sólo la primera paga el parseo.
+        """
+        plan = []
+        for trans in transformaciones_str.split(', '):
+            m = GestorNodos._TRANS_RE.match(trans)
+            if m is None:
+                continue
+            op = m['op']
+            cola = m['args'] or ''
+            parseado = GestorNodos._PARSERS[op](cola)
+            if parseado is not None:
+                plan.append((GestorNodos._ORDEN_TRANS[op], parseado))
+        
+        # sort estable: conserva el orden relativo dentro de cada bucket
+        plan.sort(key=lambda par: par[0])
+        return tuple(plan)
+    
+    def _aplicar_transformaciones_optimizado(self, nodo, transformaciones_str):
+        for _, parseado in self._compilar_plan(transformaciones_str):
+            try:
+                nombre, args = parseado[0], parseado[1]
+                kwargs = parseado[2] if len(parseado) > 2 else {}
+                if (nombre == 'redimensionar'
+                        and args[0] == nodo.imagen_procesada.size):
+                    continue
+                getattr(nodo, nombre)(*args, **kwargs)
             except Exception:
                 pass
     
-    def _fusionar_nodo_a_xml_optimizado(self, nodo, root_respuesta, indice, formato_salida, calidad):
+    def _fusionar_nodo_a_fragmento(self, nodo, indice, formato_salida, calidad):
+        """Serializa un <imagen> suelto; None si falla la codificación."""
         try:
             b64_data = nodo.convertir_y_comprimir_optimizado(formato_salida, calidad)
             
-            nueva_imagen = ET.SubElement(root_respuesta, "imagen")
-            nueva_imagen.set("formato", formato_salida)
-            nueva_imagen.set("calidad", str(calidad))
-            nueva_imagen.set("transformaciones", ", ".join(nodo.transformaciones_aplicadas))
-            nueva_imagen.set("total_transformaciones", str(len(nodo.transformaciones_aplicadas)))
-            nueva_imagen.set("indice_procesado", str(indice))
+            # Un solo dict de atributos en vez de cinco .set()
+            nueva_imagen = ET.Element("imagen", {
+                "formato": formato_salida,
+                "calidad": str(calidad),
+                "transformaciones": ", ".join(nodo.transformaciones_aplicadas),
+                "total_transformaciones": str(len(nodo.transformaciones_aplicadas)),
+                "indice_procesado": str(indice),
+                "compresion": nodo.compresion_salida,
+            })
             nueva_imagen.text = b64_data
             
-            return True
+            return ET.tostring(nueva_imagen)
             
         except Exception:
-            return False
+            return None
     
     def procesar_xml_imagenes(self, xml_content, aplicar_transformaciones=True):
         try:
-            root = ET.fromstring(xml_content)
+            root = _parse_xml(xml_content)
             imagenes = root.findall('imagen')
             num_imagenes = len(imagenes)
-            
-            if not imagenes:
-                return self._crear_xml_error("No se encontraron imágenes en el XML")
-        except:
-            return self._crear_xml_error("XML malformado")
+        except Exception:
+            raise NodoError("XML malformado") from None
         
-        with self.lock:
-            if self.imagenes_procesando + num_imagenes > self.capacidad_maxima:
-                return self._crear_xml_error("Capacidad máxima excedida")
-            self.imagenes_procesando += num_imagenes
-            self.estado = "procesando"
+        if not imagenes:
+            raise NodoError("No se encontraron imágenes en el XML")
+        
+        if not self._adquirir_capacidad(num_imagenes):
+            raise NodoError("Capacidad máxima excedida")
         
         try:
-            root_respuesta = ET.Element("imagenes_procesadas")
-            root_respuesta.set("total_procesadas", "0")
-            root_respuesta.set("total_errores", "0")
+            # Fragmentos serializados por imagen: nunca existe el árbol de
+            # respuesta completo más su serialización gigante a la vez
+            fragmentos = []
             
             resultados_por_indice = {}
             
-            with ThreadPoolExecutor(max_workers=4) as executor:
-                futures = {
-                    executor.submit(
-                        self._procesar_imagen_individual_optimizado,
-                        imagen_elem, i, aplicar_transformaciones
-                    ): i
-                    for i, imagen_elem in enumerate(imagenes)
-                }
+            if num_imagenes == 1 and _PPOOL is None:
+                # Fast path escalar: sin futures ni as_completed para el
+                # caso más común de una sola imagen
+                nodo, error, formato, calidad = \
+                    self._procesar_imagen_individual_optimizado(
+                        imagenes[0], 0, aplicar_transformaciones)
+                if error:
+                    resultados_por_indice[0] = ("error", error)
+                else:
+                    resultados_por_indice[0] = ("success", nodo, formato, calidad)
+            elif _PPOOL is not None:
+                futures = {}
+                for i, imagen_elem in enumerate(imagenes):
+                    datos_b64 = imagen_elem.text.strip() if imagen_elem.text else ""
+                    if not datos_b64:
+                        resultados_por_indice[i] = ("error", f"Sin datos en imagen {i}")
+                        continue
+                    futures[_PPOOL.submit(
+                        _procesar_imagen_proceso,
+                        datos_b64,
+                        imagen_elem.get('transformaciones', ''),
+                        imagen_elem.get('formato', 'JPEG').upper(),
+                        int(imagen_elem.get('calidad', '85')),
+                        aplicar_transformaciones)] = i
                 
                 for future in as_completed(futures):
                     i = futures[future]
-                    nodo, error, formato, calidad = future.result()
-                    
+                    b64_data, trans_str, total_trans, compresion, error = \
+                        future.result()
                     if error:
                         resultados_por_indice[i] = ("error", error)
                     else:
-                        resultados_por_indice[i] = ("success", nodo, formato, calidad)
+                        imagen_elem = imagenes[i]
+                        resultados_por_indice[i] = (
+                            "listo", b64_data,
+                            imagen_elem.get('formato', 'JPEG').upper(),
+                            int(imagen_elem.get('calidad', '85')),
+                            trans_str, total_trans, compresion)
+            else:
+                # Pipeline decode -> transform: cada imagen pasa a la etapa
+                # de transformación en cuanto termina de decodificar, sin
+                # esperar al resto del batch
+                futs_decode = {
+                    _DECODE_POOL.submit(self._decodificar_elemento,
+                                        imagen_elem, i): i
+                    for i, imagen_elem in enumerate(imagenes)
+                }
+                futs_xform = {}
+                for future in as_completed(futs_decode):
+                    i = futs_decode[future]
+                    img, error, transformaciones, formato, calidad = future.result()
+                    if error:
+                        resultados_por_indice[i] = ("error", error)
+                    else:
+                        futs_xform[_POOL.submit(
+                            self._transformar_y_fragmentar, img,
+                            transformaciones, aplicar_transformaciones,
+                            i, formato, calidad)] = i
+                
+                for future in as_completed(futs_xform):
+                    i = futs_xform[future]
+                    try:
+                        fragmento = future.result()
+                        if fragmento is not None:
+                            resultados_por_indice[i] = ("fragmento", fragmento)
+                        else:
+                            resultados_por_indice[i] = (
+                                "error", f"Fallo al codificar imagen {i}")
+                    except Exception as e:
+                        resultados_por_indice[i] = ("error", str(e))
             
             procesadas = 0
             errores = 0
@@ -321,131 +617,312 @@ class GestorNodos:
                 resultado = resultados_por_indice[i]
                 
                 if resultado[0] == "error":
-                    error_imagen = ET.SubElement(root_respuesta, "imagen")
-                    error_imagen.set("error", resultado[1])
-                    error_imagen.set("indice_original", str(i))
+                    error_imagen = ET.Element("imagen", {
+                        "error": resultado[1],
+                        "indice_original": str(i),
+                    })
+                    fragmentos.append(ET.tostring(error_imagen))
                     errores += 1
+                elif resultado[0] == "listo":
+                    # Fragmento ya codificado por el pool de procesos
+                    (_, b64_data, formato, calidad, trans_str, total_trans,
+                     compresion) = resultado
+                    nueva_imagen = ET.Element("imagen", {
+                        "formato": formato,
+                        "calidad": str(calidad),
+                        "transformaciones": trans_str,
+                        "total_transformaciones": str(total_trans),
+                        "indice_procesado": str(i),
+                        "compresion": compresion,
+                    })
+                    nueva_imagen.text = b64_data
+                    fragmentos.append(ET.tostring(nueva_imagen))
+                    procesadas += 1
+                elif resultado[0] == "fragmento":
+                    # Ya serializado dentro del worker; sólo concatenar
+                    fragmentos.append(resultado[1])
+                    procesadas += 1
                 else:
                     _, nodo, formato, calidad = resultado
-                    if self._fusionar_nodo_a_xml_optimizado(nodo, root_respuesta, i, formato, calidad):
+                    fragmento = self._fusionar_nodo_a_fragmento(nodo, i, formato, calidad)
+                    if fragmento is not None:
+                        fragmentos.append(fragmento)
                         procesadas += 1
                     else:
                         errores += 1
             
-            root_respuesta.set("total_procesadas", str(procesadas))
-            root_respuesta.set("total_errores", str(errores))
+            # Todo el ensamblado queda en bytes; el único decode a str
+            # ocurre en la frontera RPC
+            return b''.join((
+                b'<imagenes_procesadas total_procesadas="%d" total_errores="%d">'
+                % (procesadas, errores),
+                *fragmentos,
+                b'</imagenes_procesadas>'))
+            
+        except NodoError:
+            raise
+        except Exception as e:
+            raise NodoError(f"Error general: {str(e)}") from e
+        finally:
+            self._liberar_capacidad(num_imagenes)
+    
+    def _procesar_item_binario(self, item, indice, aplicar_transformaciones):
+        """Procesa un struct {datos, transformaciones, formato, calidad}."""
+        try:
+            datos = item.get('datos')
+            if isinstance(datos, xmlrpc.client.Binary):
+                datos = datos.data
+            if not datos:
+                return {'indice': indice, 'error': f"Sin datos en imagen {indice}"}
+            
+            transformaciones = item.get('transformaciones', '')
+            formato = str(item.get('formato', 'JPEG')).upper()
+            calidad = int(item.get('calidad', 85))
             
-            return ET.tostring(root_respuesta, encoding='unicode')
+            img = _abrir_imagen(_descomprimir_payload(datos))
+            
+            nodo = NodoOptimizado()
+            nodo.imagen_original = img
+            nodo.imagen_procesada = img
+            if aplicar_transformaciones and transformaciones:
+                self._aplicar_transformaciones_optimizado(nodo, transformaciones)
             
+            img_salida = nodo.imagen_procesada
+            if formato in ('JPEG', 'JPG') and img_salida.mode not in ('RGB', 'L'):
+                img_salida = img_salida.convert('RGB')
+            buffer = io.BytesIO()
+            img_salida.save(buffer, formato, quality=calidad, optimize=True)
+            
+            return {
+                'indice': indice,
+                'datos': xmlrpc.client.Binary(buffer.getvalue()),
+                'formato': formato,
+                'transformaciones': ", ".join(nodo.transformaciones_aplicadas),
+            }
         except Exception as e:
-            return self._crear_xml_error(f"Error general: {str(e)}")
+            return {'indice': indice, 'error': str(e)}
+    
+    def procesar_lote_binario(self, items, aplicar_transformaciones=True):
+        """
+        Camino binario sin XML ni base64 de aplicación: recibe una lista
+        de structs con bytes crudos y devuelve los resultados en orden.
+        """
+        num_imagenes = len(items)
+        if not num_imagenes:
+            return []
+        if not self._adquirir_capacidad(num_imagenes):
+            return [{'indice': i, 'error': "Capacidad máxima excedida"}
+                    for i in range(num_imagenes)]
+        try:
+            futures = [
+                _POOL.submit(self._procesar_item_binario, item, i,
+                             aplicar_transformaciones)
+                for i, item in enumerate(items)
+            ]
+            return [f.result() for f in futures]
         finally:
-            with self.lock:
-                self.imagenes_procesando -= num_imagenes
-                if self.imagenes_procesando == 0:
-                    self.estado = "disponible"
+            self._liberar_capacidad(num_imagenes)
     
     def procesar_xml_transformaciones(self, xml_content, transformaciones_extra=None):
         return self.procesar_xml_imagenes(xml_content, aplicar_transformaciones=True)
     
     def convertir_imagen_unica(self, xml_content, formato_salida="JPEG", calidad=85):
         try:
-            root = ET.fromstring(xml_content)
+            root = _parse_xml(xml_content)
             imagenes = root.findall('imagen')
+        except Exception:
+            raise NodoError("XML malformado") from None
+        
+        if len(imagenes) != 1:
+            raise NodoError("Solo se acepta una imagen")
+        
+        imagen_elem = imagenes[0]
+        datos_b64 = imagen_elem.text
+        
+        if not datos_b64:
+            raise NodoError("No hay datos de imagen")
+        
+        # Una sola reserva de cupo; nada de lock mientras se procesa
+        if not self._adquirir_capacidad(1):
+            raise NodoError("Capacidad máxima excedida")
+        
+        try:
+            datos_imagen = _descomprimir_payload(_a2b_base64(datos_b64))
             
-            if len(imagenes) != 1:
-                return self._crear_xml_error("Solo se acepta una imagen")
-            
-            imagen_elem = imagenes[0]
-            datos_b64 = imagen_elem.text
+            img = _abrir_imagen(datos_imagen)
             
-            if not datos_b64:
-                return self._crear_xml_error("No hay datos de imagen")
+            nodo = NodoOptimizado()
+            nodo.imagen_original = img
+            # La conversión única no transforma: sin copy()
+            nodo.imagen_procesada = img
             
-            with self.lock:
-                if self.imagenes_procesando >= self.capacidad_maxima:
-                    return self._crear_xml_error("Capacidad máxima excedida")
-                self.imagenes_procesando += 1
-                self.estado = "procesando"
+            b64_data = nodo.convertir_y_comprimir_optimizado(formato_salida.upper(), calidad)
             
-            try:
-                try:
-                    datos_comprimidos = base64.b64decode(datos_b64)
-                    datos_imagen = gzip.decompress(datos_comprimidos)
-                except:
-                    datos_imagen = base64.b64decode(datos_b64)
-                
-                img = Image.open(io.BytesIO(datos_imagen))
-                
-                nodo = NodoOptimizado()
-                nodo.imagen_original = img
-                nodo.imagen_procesada = img.copy()
-                
-                b64_data = nodo.convertir_y_comprimir_optimizado(formato_salida.upper(), calidad)
-                
-                root_respuesta = ET.Element("imagen_convertida")
-                nueva_imagen = ET.SubElement(root_respuesta, "imagen")
-                nueva_imagen.set("formato", formato_salida.upper())
-                nueva_imagen.set("calidad", str(calidad))
-                nueva_imagen.text = b64_data
-                
-                return ET.tostring(root_respuesta, encoding='unicode')
+            root_respuesta = ET.Element("imagen_convertida")
+            nueva_imagen = ET.SubElement(root_respuesta, "imagen", {
+                "formato": formato_salida.upper(),
+                "calidad": str(calidad),
+                "compresion": nodo.compresion_salida,
+            })
+            nueva_imagen.text = b64_data
                 
-            except Exception as e:
-                return self._crear_xml_error(f"Error convertiendo: {str(e)}")
-            finally:
-                with self.lock:
-                    self.imagenes_procesando -= 1
-                    if self.imagenes_procesando == 0:
-                        self.estado = "disponible"
-                        
+            return ET.tostring(root_respuesta)
+            
         except Exception as e:
-            return self._crear_xml_error(f"Error procesando XML: {str(e)}")
+            raise NodoError(f"Error convertiendo: {str(e)}") from e
+        finally:
+            self._liberar_capacidad(1)
     
     def obtener_estado(self):
-        with self.lock:
-            return {
-                "estado": self.estado,
-                "imagenes_procesando": self.imagenes_procesando,
-                "capacidad_maxima": self.capacidad_maxima,
-                "capacidad_disponible": self.capacidad_maxima - self.imagenes_procesando,
-                "disponible": self.imagenes_procesando < self.capacidad_maxima
-            }
+        # Lectura sin lock: un int se lee atómicamente en CPython, así
+        # que las consultas de estado no compiten con el procesamiento.
+        procesando = self.imagenes_procesando
+        return {
+            "estado": "procesando" if procesando > 0 else "disponible",
+            "imagenes_procesando": procesando,
+            "capacidad_maxima": self.capacidad_maxima,
+            "capacidad_disponible": self.capacidad_maxima - procesando,
+            "disponible": procesando < self.capacidad_maxima
+        }
+
+
+# Tabla de despacho op -> parser (una sola indirección por transformación)
+GestorNodos._PARSERS = {
+    'escala_grises': lambda cola: ('escala_grises', ()),
+    'rotar': GestorNodos._parse_rotar,
+    'redimensionar': GestorNodos._parse_redimensionar,
+    'recortar': GestorNodos._parse_recortar,
+    'reflejar': GestorNodos._parse_reflejar,
+    'desenfocar': GestorNodos._parse_desenfocar,
+    'perfilar': GestorNodos._parse_perfilar,
+    'ajustar_brillo': GestorNodos._parse_ajustar_brillo,
+    'ajustar_nitidez': lambda cola: GestorNodos._parse_nivel_100('ajustar_nitidez', cola),
+    'ajustar_saturacion': lambda cola: GestorNodos._parse_nivel_100('ajustar_saturacion', cola),
+    'insertar_texto': GestorNodos._parse_insertar_texto,
+}
 
 
 class RPCNodoService:
+    # Los métodos devuelven dicts y el marshalling XML-RPC los serializa
+    # como <struct> nativo: una sola serialización en lugar de
+    # json.dumps dentro de la respuesta XML-RPC. Los clientes leen
+    # resultado["success"] directo, sin json.loads.
     def __init__(self, gestor):
         self.gestor = gestor
     
     def ping(self):
         return "pong"
     
+    @staticmethod
+    def _contenido_xml(xml_content):
+        # Aceptar xmlrpc.client.Binary: llega sin el 33% de inflado de
+        # base64 que paga el marshalling de <string>
+        if isinstance(xml_content, xmlrpc.client.Binary):
+            return xml_content.data
+        return xml_content
+    
     def _procesar_con_validacion(self, xml_content, metodo_procesamiento):
         try:
+            xml_content = self._contenido_xml(xml_content)
             estado = self.gestor.obtener_estado()
             if not estado["disponible"]:
-                return json.dumps({
+                return {
                     "success": False,
                     "error": "Servidor saturado, intente más tarde"
-                })
+                }
             
             resultado = metodo_procesamiento(xml_content)
             
-            if resultado.startswith("<error>"):
-                return json.dumps({
-                    "success": False,
-                    "error": resultado
-                })
-            
-            return json.dumps({
+            return {
                 "success": True,
-                "xml_result": resultado
-            })
+                "xml_result": resultado.decode('utf-8')
+            }
+        except NodoError as e:
+            # Error de dominio: viaja como excepción, sin XML intermedio
+            return {
+                "success": False,
+                "error": str(e)
+            }
         except Exception as e:
-            return json.dumps({
+            return {
                 "success": False,
                 "error": f"Error del servidor: {str(e)}"
-            })
+            }
+    
+    def procesar_imagenes_binario(self, imagenes):
+        """
+        Variante binaria de procesar_imagenes: lista de structs
+        {datos: Binary, transformaciones, formato, calidad} y respuesta
+        con structs nativos del marshalling XML-RPC. Evita construir y
+        parsear el XML de varios MB y los pases base64/gzip de
+        aplicación en ambos sentidos.
+        """
+        try:
+            estado = self.gestor.obtener_estado()
+            if not estado["disponible"]:
+                return {'success': False,
+                        'error': "Servidor saturado, intente más tarde"}
+            resultados = self.gestor.procesar_lote_binario(imagenes)
+            return {'success': True, 'resultados': resultados}
+        except Exception as e:
+            return {'success': False, 'error': f"Error del servidor: {str(e)}"}
+    
+    @staticmethod
+    def _empaquetar_msgpack(obj):
+        return xmlrpc.client.Binary(msgpack.packb(obj, use_bin_type=True))
+    
+    def procesar_imagenes_msgpack(self, datos):
+        """
+        Como procesar_imagenes_binario pero con framing msgpack: el
+        cliente manda msgpack.packb de una lista de dicts
+        {datos: bytes, transformaciones, formato, calidad} dentro de un
+        Binary, y recibe un Binary con la respuesta empaquetada. Ni XML
+        ni base64 de aplicación en ningún sentido.
+        """
+        if msgpack is None:
+            raise RuntimeError("msgpack no está instalado en este nodo")
+        try:
+            if isinstance(datos, xmlrpc.client.Binary):
+                datos = datos.data
+            items = msgpack.unpackb(datos, raw=False)
+            
+            estado = self.gestor.obtener_estado()
+            if not estado["disponible"]:
+                return self._empaquetar_msgpack(
+                    {'success': False,
+                     'error': "Servidor saturado, intente más tarde"})
+            
+            resultados = []
+            for r in self.gestor.procesar_lote_binario(items):
+                if isinstance(r.get('datos'), xmlrpc.client.Binary):
+                    r = dict(r, datos=r['datos'].data)
+                resultados.append(r)
+            return self._empaquetar_msgpack(
+                {'success': True, 'resultados': resultados})
+        except Exception as e:
+            return self._empaquetar_msgpack(
+                {'success': False, 'error': f"Error del servidor: {str(e)}"})
+    
+    def convertir_imagen_unica_msgpack(self, datos):
+        """Conversión de una imagen con framing msgpack (sin transformar)."""
+        if msgpack is None:
+            raise RuntimeError("msgpack no está instalado en este nodo")
+        try:
+            if isinstance(datos, xmlrpc.client.Binary):
+                datos = datos.data
+            item = msgpack.unpackb(datos, raw=False)
+            resultado = self.gestor.procesar_lote_binario(
+                [item], aplicar_transformaciones=False)[0]
+            if isinstance(resultado.get('datos'), xmlrpc.client.Binary):
+                resultado = dict(resultado, datos=resultado['datos'].data)
+            if 'error' in resultado:
+                return self._empaquetar_msgpack(
+                    {'success': False, 'error': resultado['error']})
+            return self._empaquetar_msgpack(
+                {'success': True, 'resultado': resultado})
+        except Exception as e:
+            return self._empaquetar_msgpack(
+                {'success': False, 'error': f"Error del servidor: {str(e)}"})
     
     def procesar_imagenes(self, xml_content):
         return self._procesar_con_validacion(
@@ -462,41 +939,39 @@ class RPCNodoService:
     def convertir_imagen_unica(self, xml_content, formato_salida="JPEG", calidad=85):
         try:
             if formato_salida.upper() not in ['JPEG', 'JPG', 'PNG', 'WEBP', 'TIFF']:
-                return json.dumps({
+                return {
                     "success": False,
                     "error": "Formato no soportado. Use: JPEG, JPG, PNG, WEBP, TIFF"
-                })
+                }
             
             resultado = self.gestor.convertir_imagen_unica(
-                xml_content, 
+                self._contenido_xml(xml_content), 
                 formato_salida.upper(), 
                 calidad
             )
             
-            if resultado.startswith("<error>"):
-                return json.dumps({
-                    "success": False,
-                    "error": resultado
-                })
-            
-            return json.dumps({
+            return {
                 "success": True,
-                "xml_result": resultado
-            })
+                "xml_result": resultado.decode('utf-8')
+            }
+        except NodoError as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
         except Exception as e:
-            return json.dumps({
+            return {
                 "success": False,
                 "error": f"Error del servidor: {str(e)}"
-            })
+            }
     
     def obtener_estado(self):
         try:
-            estado = self.gestor.obtener_estado()
-            return json.dumps(estado)
+            return self.gestor.obtener_estado()
         except Exception as e:
-            return json.dumps({
+            return {
                 "error": f"Error al obtener estado: {str(e)}"
-            })
+            }
 
 
 def registrar_nodo_en_balanceador_rpc(ip_nodo):
@@ -528,8 +1003,13 @@ def registrar_nodo_en_balanceador_rpc(ip_nodo):
 
 def iniciar_servidor_rpc_nodo(ip, puerto=9000):
     try:
-        server = ThreadedXMLRPCServer((ip, puerto), allow_none=True)
+        server = ThreadedXMLRPCServer((ip, puerto), allow_none=True,
+                                      requestHandler=KeepAliveRequestHandler)
         server.register_introspection_functions()
+        # system.multicall: el balanceador puede empaquetar por ejemplo
+        # procesar_imagenes + obtener_estado en un solo round trip con
+        # xmlrpc.client.MultiCall
+        server.register_multicall_functions()
         
         rpc_service = RPCNodoService(gestor)
         server.register_instance(rpc_service)
@@ -542,31 +1022,12 @@ def iniciar_servidor_rpc_nodo(ip, puerto=9000):
 
 gestor = GestorNodos()
 
-app = Flask(__name__)
-CORS(app, origins="*", allow_headers=["Content-Type", "Authorization"], methods=["GET", "POST", "OPTIONS"])
-
-@app.route('/estado', methods=['GET'])
-def consultar_estado():
-    try:
-        estado = gestor.obtener_estado()
-        return jsonify(estado)
-    except Exception as e:
-        return jsonify({
-            "error": f"Error al obtener estado: {str(e)}"
-        }), 500
-
-@app.route('/salud', methods=['GET'])
-def check_health():
-    return jsonify({
-        "status": "healthy",
-        "service": "Gestor de Nodos RPC de Imagen",
-        "timestamp": time.time()
-    })
+app = crear_app(gestor)
 
 
 def ejecutar_servidor_rest(app, puerto, ip_local):
     try:
-        server = make_server(ip_local, puerto, app)
+        server = make_server(ip_local, puerto, app, threaded=True)
         print(f"✅ Servidor REST opcional iniciado en {ip_local}:{puerto}")
         server.serve_forever()
     except Exception as e:
@@ -577,6 +1038,15 @@ def main():
     print("🚀 Iniciando Nodo RPC de Imagen OPTIMIZADO...")
     print("=" * 50)
     
+    # Dejar visible qué Pillow corre: con pillow-simd instalado la versión
+    # trae sufijo .postN y los paths de resize/blur usan SIMD sin cambiar
+    # código; si aparece la versión normal hubo regresión de build
+    import PIL
+    from PIL import features as _pil_features
+    simd = '.post' in PIL.__version__
+    print(f"🖼️ Pillow {PIL.__version__} ({'SIMD' if simd else 'sin SIMD'}), "
+          f"libjpeg_turbo={_pil_features.check_feature('libjpeg_turbo')}")
+    
     ip_local = obtener_ip_real()
     print(f"🌐 IP detectada: {ip_local}")
     
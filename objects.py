@@ -1,10 +1,195 @@
 import base64
+import binascii
+import functools
 import gzip
 import io
 import os
+import struct
+import weakref
 import xml.etree.ElementTree as ET
-from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+from xml.sax.saxutils import quoteattr
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# OpenCV + NumPy (C/SIMD) aceleran las transformaciones de píxeles un
+# orden de magnitud frente a PIL en imágenes grandes; ambos opcionales.
+try:
+    import cv2
+    import numpy as np
+    _CV2_DISPONIBLE = True
+except ImportError:
+    _CV2_DISPONIBLE = False
+
+# Segundo escalón: kernels Numba JIT cuando no hay OpenCV
+import _kernels
+
+# ISA-L (igzip) implementa DEFLATE/CRC32 con SSE4/AVX y descomprime el
+# mismo formato gzip 2-4x más rápido que zlib; opcional, con fallback
+# a la stdlib. igzip sólo acepta niveles 0-3.
+try:
+    from isal import igzip as _gz
+    _GZ_NIVEL_MAX = 3
+except ImportError:
+    _gz = gzip
+    _GZ_NIVEL_MAX = 9
+
+# pybase64 (SSSE3/AVX2) codifica/decodifica base64 a velocidad cercana
+# a memcpy; opcional, la stdlib escalar queda como fallback
+try:
+    import pybase64 as _b64
+except ImportError:
+    _b64 = base64
+
+# Mismo criterio para el DEFLATE crudo de los payloads
+try:
+    from isal import isal_zlib as _zlib
+except ImportError:
+    import zlib as _zlib
+
+
+def _gzip_descomprimir_todo(datos):
+    """Descomprime un stream gzip completo, incluyendo miembros
+    concatenados que gzip.decompress descarta en silencio (un XML
+    armado a mano en dos pasadas los produce). El loop explícito sobre
+    unused_data además evita el re-parseo de cabecera del wrapper."""
+    salida = bytearray()
+    while datos:
+        d = _zlib.decompressobj(16 + _zlib.MAX_WBITS)
+        salida += d.decompress(datos)
+        datos = d.unused_data.lstrip(b'\x00')
+    return bytes(salida)
+
+
+def _cv2_aplicable(imagen):
+    """Sólo los modos que mapean directo a un ndarray uint8 sin paleta."""
+    return _CV2_DISPONIBLE and imagen.mode in ('RGB', 'L')
+
+
+@functools.cache
+def _fuente_por_defecto():
+    """La fuente bitmap por defecto se carga de disco una sola vez."""
+    return ImageFont.load_default()
+
+
+# Alias de formato -> nombre canónico de PIL, un lookup en vez de
+# cadenas de comparaciones .upper() por llamada
+_FMT_ALIASES = {"JPG": "JPEG", "JPEG": "JPEG", "PNG": "PNG",
+                "TIF": "TIFF", "TIFF": "TIFF", "WEBP": "WEBP"}
+
+# Formatos de timestamp compilados una vez: strftime parsea el patrón
+# en cada llamada, y _now evita la doble resolución de atributo en los
+# bucles de cadenas largas
+_TS_FMT = "%Y-%m-%d %H:%M:%S"
+_TS_ARCHIVO = "%Y%m%d_%H%M%S"
+_now = datetime.datetime.now
+
+# Formato de salida -> (opciones de save por calidad, requiere RGB).
+# Un lookup reemplaza la escalera de comparaciones; agregar un formato
+# nuevo es una línea.
+_FORMAT_TABLE = {
+    "JPEG": (lambda calidad: {"quality": calidad, "optimize": True}, True),
+    "PNG": (lambda calidad: {"optimize": True}, False),
+    "WEBP": (lambda calidad: {"quality": calidad, "optimize": True}, False),
+}
+
+
+class _B64Stream(io.RawIOBase):
+    """
+    Decodifica base64 por bloques desde el texto del XML. Encadenado con
+    GzipFile e Image.open, la imagen se decodifica sin materializar
+    nunca los bytes comprimidos completos (3x el payload en transitorios
+    para un JPEG grande por la vía bytes -> bytes -> BytesIO).
+    """
+    _BLOQUE = 65536
+    
+    def __init__(self, texto_b64):
+        self._texto = texto_b64
+        self._pos = 0
+        self._cola = ''      # chars que no completan un grupo de 4
+        self._decodificado = b''
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, destino):
+        if not self._decodificado:
+            while self._pos < len(self._texto):
+                bloque = self._cola + self._texto[self._pos:self._pos + self._BLOQUE]
+                self._pos += self._BLOQUE
+                bloque = ''.join(bloque.split())  # tolera saltos de línea
+                corte = len(bloque) & ~3
+                self._cola = bloque[corte:]
+                if corte:
+                    self._decodificado = binascii.a2b_base64(bloque[:corte])
+                    break
+            else:
+                if self._cola:
+                    self._decodificado = binascii.a2b_base64(self._cola)
+                    self._cola = ''
+        n = min(len(destino), len(self._decodificado))
+        destino[:n] = self._decodificado[:n]
+        self._decodificado = self._decodificado[n:]
+        return n
+
+
+class _Sink(io.RawIOBase):
+    """
+    Destino de escritura sobre un bytearray preasignado: evita los
+    realloc incrementales de BytesIO y la copia de getvalue() al
+    codificar. Soporta seek porque algunos encoders de PIL (TIFF)
+    retroceden a parchear cabeceras.
+    """
+    
+    def __init__(self, capacidad):
+        self.buf = bytearray(capacidad)
+        self.pos = 0
+        self.fin = 0  # marca de agua: tamaño real escrito
+    
+    def writable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def write(self, b):
+        n = len(b)
+        tope = self.pos + n
+        if tope > len(self.buf):
+            # crecer de a mitades, como hace bytearray internamente
+            self.buf.extend(bytes(max(tope - len(self.buf), len(self.buf) // 2)))
+        self.buf[self.pos:tope] = b
+        self.pos = tope
+        if tope > self.fin:
+            self.fin = tope
+        return n
+    
+    def seek(self, pos, whence=0):
+        if whence == 1:
+            pos += self.pos
+        elif whence == 2:
+            pos += self.fin
+        self.pos = pos
+        return pos
+    
+    def tell(self):
+        return self.pos
+    
+    def datos(self):
+        """Vista sin copia sobre lo escrito."""
+        return memoryview(self.buf)[:self.fin]
+
+
+def _abrir_imagen_streaming(texto_b64):
+    """Abre la imagen del XML decodificando base64 en streaming; la
+    envoltura gzip se detecta por magic bytes (puede no estar)."""
+    flujo = io.BufferedReader(_B64Stream(texto_b64), buffer_size=131072)
+    if flujo.peek(2)[:2] == b'\x1f\x8b':
+        img = Image.open(gzip.GzipFile(fileobj=flujo))
+    else:
+        img = Image.open(flujo)
+    img.load()
+    return img
 
 
 class LectorXML:
@@ -20,26 +205,76 @@ class LectorXML:
             archivo_xml (str): Ruta del archivo XML a leer
         """
         self.archivo_xml = archivo_xml
-        self.tree = None
+        self.cargado = False
+        # (comprimido, descomprimido) por índice: evita repetir el
+        # base64 + gzip del mismo blob entre mostrar_informacion,
+        # comparar_tamaños y extraer_imagen
+        self._cache_decodificado = {}
         self.cargar_xml()
     
     def cargar_xml(self):
-        """Carga el archivo XML."""
+        """
+        Valida el XML sin construir el árbol completo: las lecturas
+        posteriores usan iterparse en streaming, así el base64 gigante
+        de cada imagen nunca vive entero en memoria como DOM.
+        """
+        self._cache_decodificado.clear()
+        self.cargado = False
         try:
-            self.tree = ET.parse(self.archivo_xml)
+            # Consumir el primer evento valida cabecera y existencia
+            next(ET.iterparse(self.archivo_xml, events=('start',)), None)
+            self.cargado = True
             print(f"✅ XML cargado: {self.archivo_xml}")
         except ET.ParseError as e:
             print(f"⌐ Error al parsear XML: {e}")
         except FileNotFoundError:
             print(f"⌐ Archivo no encontrado: {self.archivo_xml}")
     
+    def _iter_imagenes(self):
+        """Itera los <imagen> uno a la vez y libera cada elemento
+        (y su texto base64) apenas se consume."""
+        for _, elem in ET.iterparse(self.archivo_xml):
+            if elem.tag == 'imagen':
+                yield elem
+                elem.clear()
+    
+    def _decodificar(self, indice, texto_b64):
+        """Devuelve (bytes_comprimidos, bytes_imagen) de la imagen
+        `indice`, memoizado entre métodos."""
+        resultado = self._cache_decodificado.get(indice)
+        if resultado is None:
+            datos_comprimidos = _b64.b64decode(texto_b64)
+            if datos_comprimidos[:2] == b'\x1f\x8b':
+                datos_imagen = _gzip_descomprimir_todo(datos_comprimidos)
+            else:
+                # payload sin envoltura gzip (JPEG/PNG/WEBP directos)
+                datos_imagen = datos_comprimidos
+            resultado = (datos_comprimidos, datos_imagen)
+            self._cache_decodificado[indice] = resultado
+        return resultado
+    
+    def _medir(self, indice, texto_b64):
+        """Devuelve (bytes_comprimido, bytes_original) sin inflar el
+        payload: el trailer gzip guarda el tamaño original (ISIZE,
+        módulo 2^32) en sus últimos 4 bytes. Sólo para estadísticas;
+        quien necesite los bytes reales usa _decodificar."""
+        resultado = self._cache_decodificado.get(indice)
+        if resultado is not None:
+            return (len(resultado[0]), len(resultado[1]))
+        datos_comprimidos = _b64.b64decode(texto_b64)
+        if datos_comprimidos[:2] == b'\x1f\x8b':
+            tamaño_original = struct.unpack('<I', datos_comprimidos[-4:])[0]
+        else:
+            # sin gzip (JPEG/PNG/WEBP directos): el payload ES la imagen
+            tamaño_original = len(datos_comprimidos)
+        return (len(datos_comprimidos), tamaño_original)
+    
     def mostrar_informacion(self):
         """Muestra información completa del XML."""
-        if not self.tree:
+        if not self.cargado:
             print("⌐ No hay XML cargado")
             return
         
-        root = self.tree.getroot()
         print(f"\n📄 INFORMACIÓN DEL XML: {self.archivo_xml}")
         print("=" * 50)
         
@@ -47,27 +282,36 @@ class LectorXML:
         tamaño_archivo = os.path.getsize(self.archivo_xml) / 1024  # KB
         print(f"📁 Tamaño del archivo: {tamaño_archivo:.2f} KB")
         
-        # Información de cada imagen
-        for i, imagen in enumerate(root.findall('imagen'), 1):
+        # Decodificar en paralelo: base64 y DEFLATE sueltan el GIL en su
+        # núcleo C, así los payloads independientes escalan por hilo
+        pendientes = []
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+            for i, imagen in enumerate(self._iter_imagenes(), 1):
+                info = (imagen.get('formato', 'No especificado'),
+                        imagen.get('transformaciones', 'Ninguna'),
+                        imagen.get('total_transformaciones', '0'))
+                datos_b64 = imagen.text
+                futuro = (pool.submit(self._medir, i - 1, datos_b64)
+                          if datos_b64 else None)
+                pendientes.append((info, len(datos_b64 or ''), futuro))
+        
+        # Información de cada imagen, en orden
+        for i, (info, tamaño_b64, futuro) in enumerate(pendientes, 1):
             print(f"\n🖼️  IMAGEN {i}:")
-            print(f"   📋 Formato: {imagen.get('formato', 'No especificado')}")
-            print(f"   🔄 Transformaciones: {imagen.get('transformaciones', 'Ninguna')}")
-            print(f"   📊 Total transformaciones: {imagen.get('total_transformaciones', '0')}")
+            print(f"   📋 Formato: {info[0]}")
+            print(f"   🔄 Transformaciones: {info[1]}")
+            print(f"   📊 Total transformaciones: {info[2]}")
             
-            # Información de los datos
-            datos_b64 = imagen.text
-            if datos_b64:
-                tamaño_b64 = len(datos_b64)
+            if futuro is not None:
                 print(f"   💾 Tamaño datos base64: {tamaño_b64:,} caracteres")
                 
-                # Calcular tamaño descomprimido aproximado
+                # Tamaño descomprimido leído del trailer gzip, sin inflar
                 try:
-                    datos_comprimidos = base64.b64decode(datos_b64)
-                    datos_descomprimidos = gzip.decompress(datos_comprimidos)
-                    tamaño_original = len(datos_descomprimidos) / 1024
-                    ratio_compresion = len(datos_comprimidos) / len(datos_descomprimidos) * 100
+                    tamaño_comprimido, tamaño_descomprimido = futuro.result()
+                    tamaño_original = tamaño_descomprimido / 1024
+                    ratio_compresion = tamaño_comprimido / tamaño_descomprimido * 100
                     
-                    print(f"   📦 Tamaño comprimido: {len(datos_comprimidos)/1024:.2f} KB")
+                    print(f"   📦 Tamaño comprimido: {tamaño_comprimido/1024:.2f} KB")
                     print(f"   📂 Tamaño descomprimido: {tamaño_original:.2f} KB")
                     print(f"   📈 Ratio de compresión: {ratio_compresion:.1f}%")
                     
@@ -82,66 +326,83 @@ class LectorXML:
             indice (int): Índice de la imagen a extraer (0 para la primera)
             ruta_salida (str): Ruta donde guardar la imagen
         """
-        if not self.tree:
+        if not self.cargado:
             print("⌐ No hay XML cargado")
             return
         
-        imagenes = self.tree.getroot().findall('imagen')
-        if indice >= len(imagenes):
-            print(f"⌐ Índice {indice} fuera de rango. Hay {len(imagenes)} imagen(es)")
-            return
-        
-        imagen_elem = imagenes[indice]
-        formato = imagen_elem.get('formato', 'PNG')
-        
-        if not ruta_salida:
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            ruta_salida = f"imagen_extraida_{timestamp}.{formato.lower()}"
-        
-        try:
-            # Decodificar y descomprimir
-            datos_b64 = imagen_elem.text
-            datos_comprimidos = base64.b64decode(datos_b64)
-            datos_imagen = gzip.decompress(datos_comprimidos)
+        total = 0
+        for i, imagen_elem in enumerate(self._iter_imagenes()):
+            total += 1
+            if i != indice:
+                continue
             
-            # Crear imagen y guardar
-            img = Image.open(io.BytesIO(datos_imagen))
-            img.save(ruta_salida)
+            formato = imagen_elem.get('formato', 'PNG')
+            if not ruta_salida:
+                timestamp = _now().strftime(_TS_ARCHIVO)
+                ruta_salida = f"imagen_extraida_{timestamp}.{formato.lower()}"
             
-            print(f"✅ Imagen extraída: {ruta_salida}")
-            print(f"   📏 Dimensiones: {img.size}")
-            print(f"   🎨 Modo: {img.mode}")
-            
-        except Exception as e:
-            print(f"⌐ Error al extraer imagen: {e}")
+            try:
+                ext = os.path.splitext(ruta_salida)[1].lstrip('.').upper()
+                alias = {'JPG': 'JPEG'}
+                if alias.get(ext, ext) == alias.get(formato.upper(), formato.upper()):
+                    # Mismo formato: los bytes descomprimidos SON el
+                    # archivo; escribir directo evita el decode+encode
+                    # completo de PIL, lo más caro del método
+                    _, datos_imagen = self._decodificar(indice, imagen_elem.text)
+                    with open(ruta_salida, 'wb') as f:
+                        f.write(datos_imagen)
+                    # Image.open sólo lee la cabecera: size y mode salen
+                    # sin decodificar los píxeles
+                    img = Image.open(io.BytesIO(datos_imagen))
+                else:
+                    resultado = self._cache_decodificado.get(indice)
+                    if resultado is not None:
+                        img = Image.open(io.BytesIO(resultado[1]))
+                    else:
+                        # Sin hit de cache, decodificar en streaming: no se
+                        # materializan los bytes intermedios del payload
+                        img = _abrir_imagen_streaming(imagen_elem.text)
+                    img.save(ruta_salida)
+                
+                print(f"✅ Imagen extraída: {ruta_salida}")
+                print(f"   📏 Dimensiones: {img.size}")
+                print(f"   🎨 Modo: {img.mode}")
+                
+            except Exception as e:
+                print(f"⌐ Error al extraer imagen: {e}")
+            return
+        
+        print(f"⌐ Índice {indice} fuera de rango. Hay {total} imagen(es)")
     
     def comparar_tamaños(self):
         """Compara tamaños de compresión."""
-        if not self.tree:
+        if not self.cargado:
             return
         
         print(f"\n📊 ANÁLISIS DE COMPRESIÓN")
         print("=" * 40)
         
-        for i, imagen in enumerate(self.tree.getroot().findall('imagen')):
-            datos_b64 = imagen.text
-            if datos_b64:
-                try:
-                    datos_comprimidos = base64.b64decode(datos_b64)
-                    datos_descomprimidos = gzip.decompress(datos_comprimidos)
-                    
-                    tamaño_original = len(datos_descomprimidos)
-                    tamaño_comprimido = len(datos_comprimidos)
-                    tamaño_b64 = len(datos_b64)
-                    
-                    print(f"🖼️  Imagen {i+1}:")
-                    print(f"   Original: {tamaño_original/1024:.2f} KB")
-                    print(f"   Comprimido: {tamaño_comprimido/1024:.2f} KB")
-                    print(f"   Base64: {tamaño_b64/1024:.2f} KB")
-                    print(f"   Reducción: {(1-tamaño_comprimido/tamaño_original)*100:.1f}%")
-                    
-                except Exception as e:
-                    print(f"⌐ Error en imagen {i+1}: {e}")
+        pendientes = []
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+            for i, imagen in enumerate(self._iter_imagenes()):
+                datos_b64 = imagen.text
+                if datos_b64:
+                    pendientes.append(
+                        (i, len(datos_b64),
+                         pool.submit(self._medir, i, datos_b64)))
+        
+        for i, tamaño_b64, futuro in pendientes:
+            try:
+                tamaño_comprimido, tamaño_original = futuro.result()
+                
+                print(f"🖼️  Imagen {i+1}:")
+                print(f"   Original: {tamaño_original/1024:.2f} KB")
+                print(f"   Comprimido: {tamaño_comprimido/1024:.2f} KB")
+                print(f"   Base64: {tamaño_b64/1024:.2f} KB")
+                print(f"   Reducción: {(1-tamaño_comprimido/tamaño_original)*100:.1f}%")
+                
+            except Exception as e:
+                print(f"⌐ Error en imagen {i+1}: {e}")
 
 
 class NodoOptimizado:
@@ -150,12 +411,30 @@ class NodoOptimizado:
     y soporte para cargar imágenes desde XML.
     """
     
+    # Imágenes ya decodificadas por ruta de XML generado: una cadena de
+    # etapas en el mismo proceso se salta el ciclo JPEG+gzip+base64 de
+    # relectura. Débil sobre una copia anclada al nodo productor: vive
+    # mientras viva el nodo y no la tocan mutaciones posteriores; el
+    # mtime invalida si otro proceso reescribe el archivo.
+    _cache_xml = weakref.WeakValueDictionary()
+    _cache_xml_mtime = {}
+
+    @classmethod
+    def _olvidar_mtime(cls, ruta):
+        """Al morir la entrada débil, su mtime no debe quedar
+        acumulándose en el dict fuerte (salvo que la ruta ya se haya
+        re-registrado con otra imagen)."""
+        if ruta not in cls._cache_xml:
+            cls._cache_xml_mtime.pop(ruta, None)
+    
     def __init__(self, imagen_path=None):
         # Misma inicialización que la clase original
         self.imagen_original = None
         self.imagen_procesada = None
         self.transformaciones_aplicadas = []
         self.MAX_TRANSFORMACIONES = 20
+        # compresión del último payload generado ("gzip"/"ninguna")
+        self.compresion_salida = "gzip"
         
         if imagen_path:
             self.cargar_imagen(imagen_path)
@@ -171,12 +450,21 @@ class NodoOptimizado:
         
         # Detectar si es un archivo XML
         if imagen_path.lower().endswith('.xml'):
+            ruta = os.path.abspath(imagen_path)
+            imagen_cacheada = NodoOptimizado._cache_xml.get(ruta)
+            if (imagen_cacheada is not None
+                    and NodoOptimizado._cache_xml_mtime.get(ruta)
+                    == os.path.getmtime(ruta)):
+                self.imagen_original = imagen_cacheada
+                self.imagen_procesada = imagen_cacheada
+                print(f"✅ Imagen cargada desde cache en memoria: {imagen_path}")
+                return
             self._cargar_desde_xml(imagen_path)
         else:
             # Cargar imagen tradicional
             try:
                 self.imagen_original = Image.open(imagen_path)
-                self.imagen_procesada = self.imagen_original.copy()
+                self.imagen_procesada = self.imagen_original
                 print(f"✅ Imagen cargada: {imagen_path}")
             except Exception as e:
                 print(f"⌐ Error al cargar imagen: {e}. Creando imagen de prueba...")
@@ -212,13 +500,9 @@ class NodoOptimizado:
                 self._crear_imagen_prueba()
                 return
             
-            # Decodificar y descomprimir la imagen
-            datos_comprimidos = base64.b64decode(datos_b64)
-            datos_imagen = gzip.decompress(datos_comprimidos)
-            
-            # Crear objeto Image
-            self.imagen_original = Image.open(io.BytesIO(datos_imagen))
-            self.imagen_procesada = self.imagen_original.copy()
+            # Decodificar y descomprimir la imagen en streaming
+            self.imagen_original = _abrir_imagen_streaming(datos_b64)
+            self.imagen_procesada = self.imagen_original
             
             # Mostrar información de carga
             formato = imagen_elem.get('formato', 'Desconocido')
@@ -242,24 +526,191 @@ class NodoOptimizado:
         draw = ImageDraw.Draw(self.imagen_original)
         draw.rectangle([25, 25, 275, 275], outline=(100, 100, 100), width=2)
         draw.text((100, 140), "Prueba Optimizada", fill=(0, 0, 0))
-        self.imagen_procesada = self.imagen_original.copy()
+        self.imagen_procesada = self.imagen_original
         print("✅ Imagen de prueba optimizada creada")
     
+    @classmethod
+    def desde_bytes(cls, datos_imagen):
+        """
+        Crea un nodo directamente desde los bytes crudos de una imagen,
+        sin pasar por archivos en disco.
+        
+        Args:
+            datos_imagen (bytes): Contenido de la imagen (JPEG, PNG, etc.)
+        """
+        nodo = cls.__new__(cls)
+        nodo.imagen_original = Image.open(io.BytesIO(datos_imagen))
+        nodo.imagen_procesada = nodo.imagen_original
+        nodo.transformaciones_aplicadas = []
+        nodo.MAX_TRANSFORMACIONES = 20
+        nodo.compresion_salida = "gzip"
+        return nodo
+    
+    @classmethod
+    def desde_b64(cls, datos_b64):
+        """
+        Crea un nodo desde datos base64+gzip en memoria (el formato que
+        viaja en los XML), sin escribir ningún XML temporal.
+        """
+        datos_comprimidos = _b64.b64decode(datos_b64)
+        if datos_comprimidos[:2] == b'\x1f\x8b':
+            datos_comprimidos = _gzip_descomprimir_todo(datos_comprimidos)
+        return cls.desde_bytes(datos_comprimidos)
+    
+    # Operaciones por píxel que el kernel fusionado sabe colapsar
+    _OPS_FUSIBLES = frozenset(
+        ('escala_grises', 'reflejar', 'ajustar_brillo_contraste'))
+
+    def aplicar_plan(self, plan):
+        """Aplica un plan compilado ((método, args), ...). Corridas de
+        dos o más operaciones por píxel consecutivas (gris, reflejos,
+        brillo/contraste) se colapsan en un solo recorrido del buffer
+        vía el kernel numba; sin numba, o en modos sin ndarray directo,
+        se despacha método a método como siempre."""
+        i = 0
+        while i < len(plan):
+            corrida = self._corrida_fusible(plan, i)
+            if corrida > 1 and self._fusionar_corrida(plan[i:i + corrida]):
+                i += corrida
+            else:
+                nombre, args = plan[i]
+                getattr(self, nombre)(*args)
+                i += 1
+        return self
+
+    @classmethod
+    def _corrida_fusible(cls, plan, inicio):
+        """Largo de la corrida fusible que empieza en `inicio`. Se corta
+        en la segunda brillo/contraste (su LUT depende del histograma
+        del momento) y en un gris posterior a una LUT ya aplicada."""
+        bc_visto = False
+        fin = inicio
+        for nombre, _ in plan[inicio:]:
+            if nombre not in cls._OPS_FUSIBLES:
+                break
+            if nombre == 'ajustar_brillo_contraste':
+                if bc_visto:
+                    break
+                bc_visto = True
+            elif nombre == 'escala_grises' and bc_visto:
+                break
+            fin += 1
+        return fin - inicio
+
+    def _fusionar_corrida(self, ops):
+        """Ejecuta una corrida fusible en un pase; False si no aplica
+        (sin numba, modo con paleta/alfa, o presupuesto agotado)."""
+        if not (_kernels.DISPONIBLE
+                and self.imagen_procesada.mode in ('RGB', 'L')):
+            return False
+        if (len(self.transformaciones_aplicadas) + len(ops)
+                > self.MAX_TRANSFORMACIONES):
+            return False
+        gris = False
+        flip_h = flip_v = False
+        bc = None
+        for nombre, args in ops:
+            if nombre == 'escala_grises':
+                gris = True
+            elif nombre == 'reflejar':
+                if args and args[0] == 'vertical':
+                    flip_v = not flip_v
+                else:
+                    flip_h = not flip_h
+            else:
+                bc = (args[0] if len(args) > 0 else 1.0,
+                      args[1] if len(args) > 1 else 1.0)
+        if bc is None:
+            lut = list(range(256))
+        else:
+            # Misma matemática que ajustar_brillo_contraste: brillo
+            # multiplica, contraste escala alrededor de la media en gris
+            # (los flips no alteran el histograma, así que la media vale
+            # igual calculada antes del recorrido)
+            brillo, contraste = bc
+            lut_brillo = [min(255, int(v * brillo + 0.5)) for v in range(256)]
+            if self.imagen_procesada.mode == 'L':
+                hist = self.imagen_procesada.histogram()
+            else:
+                hist = self.imagen_procesada.convert('L').histogram()
+            total = sum(hist)
+            media = (sum(n * lut_brillo[v] for v, n in enumerate(hist)) / total
+                     if total else 128.0)
+            lut = [max(0, min(255, int(media + contraste * (lut_brillo[v] - media) + 0.5)))
+                   for v in range(256)]
+        try:
+            arr = _kernels.cadena(_kernels.np.asarray(self.imagen_procesada),
+                                  gris, flip_h, flip_v, lut)
+        except Exception:
+            # numba compila perezoso: un kernel que no tipa revienta
+            # recién en la primera llamada; la corrida cae al despacho
+            # método a método en vez de abortar la imagen
+            return False
+        self.imagen_procesada = Image.fromarray(arr)
+        for nombre, args in ops:
+            if nombre == 'escala_grises':
+                self._registrar_transformacion("escala_grises")
+            elif nombre == 'reflejar':
+                direccion = args[0] if args else 'horizontal'
+                self._registrar_transformacion(f"reflejar_{direccion}")
+            else:
+                brillo, contraste = bc
+                self._registrar_transformacion(
+                    f"ajustar_brillo_{brillo}_contraste_{contraste}")
+        return True
+
     def escala_grises(self):
         """Convierte la imagen a escala de grises."""
         if self._puede_aplicar_transformacion():
-            self.imagen_procesada = self.imagen_procesada.convert("L")
+            if _cv2_aplicable(self.imagen_procesada) and self.imagen_procesada.mode == 'RGB':
+                arr = cv2.cvtColor(np.asarray(self.imagen_procesada), cv2.COLOR_RGB2GRAY)
+                self.imagen_procesada = Image.fromarray(arr, 'L')
+            else:
+                self.imagen_procesada = self.imagen_procesada.convert("L")
             self._registrar_transformacion("escala_grises")
         return self
     
-    def redimensionar(self, size=(200, 200)):
-        """Redimensiona la imagen al tamaño especificado."""
+    def redimensionar(self, size=(200, 200), filtro=None):
+        """Redimensiona la imagen al tamaño especificado.
+        
+        `filtro` permite forzar el resampleo; por defecto se usa
+        BILINEAR para destinos chicos (4x menos multiplicaciones que
+        LANCZOS, sin diferencia visible en miniaturas) y LANCZOS para
+        destinos grandes o ampliaciones.
+        """
         if self._puede_aplicar_transformacion():
-            # Usar LANCZOS para mejor calidad en redimensionamiento
-            self.imagen_procesada = self.imagen_procesada.resize(size, Image.Resampling.LANCZOS)
+            if _cv2_aplicable(self.imagen_procesada):
+                arr = np.asarray(self.imagen_procesada)
+                # INTER_AREA al reducir (antialiasing barato), LANCZOS4 al ampliar
+                alto, ancho = arr.shape[:2]
+                interp = (cv2.INTER_AREA if size[0] < ancho or size[1] < alto
+                          else cv2.INTER_LANCZOS4)
+                self.imagen_procesada = Image.fromarray(
+                    cv2.resize(arr, size, interpolation=interp))
+            else:
+                if filtro is None:
+                    ancho, alto = self.imagen_procesada.size
+                    reduce = size[0] < ancho or size[1] < alto
+                    filtro = (Image.Resampling.BILINEAR
+                              if reduce and max(size) <= 512
+                              else Image.Resampling.LANCZOS)
+                self.imagen_procesada = self.imagen_procesada.resize(size, filtro)
             self._registrar_transformacion(f"redimensionar_{size[0]}x{size[1]}")
         return self
     
+    def miniatura(self, size=(150, 150)):
+        """
+        Reduce a miniatura en un solo paso: thumbnail hace un box-reduce
+        entero primero y un único pase LANCZOS al final, más barato que
+        encadenar redimensionar() sucesivos.
+        """
+        if self._puede_aplicar_transformacion():
+            self._cow()  # thumbnail muta la imagen en sitio
+            self.imagen_procesada.thumbnail(
+                size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+            self._registrar_transformacion(f"miniatura_{size[0]}x{size[1]}")
+        return self
+    
     def recortar(self, box=(0, 0, 100, 100)):
         """Recorta la imagen según la caja especificada (left, top, right, bottom)."""
         if self._puede_aplicar_transformacion():
@@ -291,31 +742,86 @@ class NodoOptimizado:
     def desenfocar(self, radio=2):
         """Aplica un desenfoque gaussiano a la imagen."""
         if self._puede_aplicar_transformacion():
-            self.imagen_procesada = self.imagen_procesada.filter(ImageFilter.GaussianBlur(radio))
+            if _cv2_aplicable(self.imagen_procesada):
+                arr = cv2.GaussianBlur(np.asarray(self.imagen_procesada),
+                                       (0, 0), sigmaX=radio)
+                self.imagen_procesada = Image.fromarray(arr)
+            else:
+                self.imagen_procesada = self.imagen_procesada.filter(ImageFilter.GaussianBlur(radio))
             self._registrar_transformacion(f"desenfocar_radio_{radio}")
         return self
     
     def perfilar(self, factor=2.0):
         """Aumenta la nitidez de la imagen."""
         if self._puede_aplicar_transformacion():
-            enhancer = ImageEnhance.Sharpness(self.imagen_procesada)
-            self.imagen_procesada = enhancer.enhance(factor)
+            if (not _CV2_DISPONIBLE and _kernels.DISPONIBLE
+                    and self.imagen_procesada.mode in ('RGB', 'L')):
+                arr = _kernels.perfilar(
+                    _kernels.np.asarray(self.imagen_procesada), factor)
+                self.imagen_procesada = Image.fromarray(arr)
+            else:
+                enhancer = ImageEnhance.Sharpness(self.imagen_procesada)
+                self.imagen_procesada = enhancer.enhance(factor)
             self._registrar_transformacion(f"perfilar_factor_{factor}")
         return self
     
     def ajustar_brillo_contraste(self, brillo=1.0, contraste=1.0):
         """Ajusta el brillo y el contraste de la imagen."""
         if self._puede_aplicar_transformacion():
-            enhancer_brillo = ImageEnhance.Brightness(self.imagen_procesada)
-            self.imagen_procesada = enhancer_brillo.enhance(brillo)
-            enhancer_contraste = ImageEnhance.Contrast(self.imagen_procesada)
-            self.imagen_procesada = enhancer_contraste.enhance(contraste)
+            if (not _CV2_DISPONIBLE and _kernels.DISPONIBLE
+                    and self.imagen_procesada.mode in ('RGB', 'L')):
+                arr = _kernels.brillo_contraste(
+                    _kernels.np.asarray(self.imagen_procesada), brillo, contraste)
+                self.imagen_procesada = Image.fromarray(arr)
+            elif _cv2_aplicable(self.imagen_procesada):
+                # Mismas fórmulas que ImageEnhance: brillo multiplica, el
+                # contraste escala alrededor de la media en gris
+                arr = np.asarray(self.imagen_procesada)
+                if brillo != 1.0:
+                    arr = cv2.convertScaleAbs(arr, alpha=brillo, beta=0)
+                if contraste != 1.0:
+                    gris = (cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
+                            if arr.ndim == 3 else arr)
+                    media = float(gris.mean())
+                    arr = cv2.convertScaleAbs(arr, alpha=contraste,
+                                              beta=media * (1.0 - contraste))
+                self.imagen_procesada = Image.fromarray(arr)
+            elif self.imagen_procesada.mode in ('RGB', 'L'):
+                # LUT fusionada de 256 entradas con Image.point: un solo
+                # pase C en lugar de los dos Image.blend de ImageEnhance.
+                # Misma matemática: brillo multiplica, contraste escala
+                # alrededor de la media en gris (sale del histograma)
+                lut_brillo = [min(255, int(v * brillo + 0.5)) for v in range(256)]
+                if self.imagen_procesada.mode == 'L':
+                    hist = self.imagen_procesada.histogram()
+                else:
+                    hist = self.imagen_procesada.convert('L').histogram()
+                total = sum(hist)
+                media = (sum(n * lut_brillo[v] for v, n in enumerate(hist)) / total
+                         if total else 128.0)
+                lut = [max(0, min(255, int(media + contraste * (lut_brillo[v] - media) + 0.5)))
+                       for v in range(256)]
+                bandas = len(self.imagen_procesada.getbands())
+                self.imagen_procesada = self.imagen_procesada.point(lut * bandas)
+            else:
+                enhancer_brillo = ImageEnhance.Brightness(self.imagen_procesada)
+                self.imagen_procesada = enhancer_brillo.enhance(brillo)
+                enhancer_contraste = ImageEnhance.Contrast(self.imagen_procesada)
+                self.imagen_procesada = enhancer_contraste.enhance(contraste)
             self._registrar_transformacion(f"ajustar_brillo_{brillo}_contraste_{contraste}")
         return self
     
+    def _cow(self):
+        """Copy-on-write: las transformaciones de PIL devuelven imágenes
+        nuevas, así que imagen_procesada arranca como alias del original
+        y sólo se copia ante una mutación en sitio."""
+        if self.imagen_procesada is self.imagen_original:
+            self.imagen_procesada = self.imagen_original.copy()
+    
     def insertar_texto(self, texto="Marca de agua", posicion=(10, 10), color=(255, 255, 255)):
         """Inserta texto o marca de agua en la imagen."""
         if self._puede_aplicar_transformacion():
+            self._cow()  # único mutador en sitio: dibuja sobre la imagen
             draw = ImageDraw.Draw(self.imagen_procesada)
             
             # Ajustar color según el modo de la imagen
@@ -328,13 +834,13 @@ class NodoOptimizado:
                         color_gris = color[0] if len(color) > 0 else 255
                 else:
                     color_gris = color
-                draw.text(posicion, texto, fill=color_gris)
+                draw.text(posicion, texto, fill=color_gris, font=_fuente_por_defecto())
             elif self.imagen_procesada.mode == "1":  # Blanco y negro
                 # Para modo binario, usar solo 0 (negro) o 255 (blanco)
                 color_binario = 255 if sum(color) > 384 else 0  # Umbral para decidir blanco/negro
-                draw.text(posicion, texto, fill=color_binario)
+                draw.text(posicion, texto, fill=color_binario, font=_fuente_por_defecto())
             else:  # RGB, RGBA, etc.
-                draw.text(posicion, texto, fill=color)
+                draw.text(posicion, texto, fill=color, font=_fuente_por_defecto())
             
             self._registrar_transformacion(f"insertar_texto_{texto}")
         return self
@@ -342,16 +848,13 @@ class NodoOptimizado:
     def convertir_formato(self, formato="JPEG"):
         """Convierte la imagen al formato especificado (JPG, PNG, TIF)."""
         if self._puede_aplicar_transformacion():
-            if formato.upper() in ["JPG", "JPEG"]:
-                if self.imagen_procesada.mode in ("RGBA", "LA", "P"):
-                    self.imagen_procesada = self.imagen_procesada.convert("RGB")
-            elif formato.upper() == "PNG":
-                pass  # PNG soporta RGBA
-            elif formato.upper() == "TIF" or formato.upper() == "TIFF":
-                pass  # TIFF soporta varios modos
-            else:
+            canonico = _FMT_ALIASES.get(formato.upper())
+            if canonico is None:
                 print(f"⚠️ Formato no soportado: {formato}. Manteniendo actual.")
                 return self
+            if canonico == "JPEG" and self.imagen_procesada.mode in ("RGBA", "LA", "P"):
+                self.imagen_procesada = self.imagen_procesada.convert("RGB")
+            # PNG y TIFF soportan los demás modos tal cual
             self._registrar_transformacion(f"convertir_a_{formato.upper()}")
         return self
     
@@ -374,33 +877,39 @@ class NodoOptimizado:
             calidad (int): Calidad para JPEG/WEBP (1-95, menor = más compresión)
             nivel_compresion (int): Nivel de compresión gzip (1-9, mayor = más compresión)
         """
-        buffer = io.BytesIO()
-        
-        # Configurar opciones según formato
-        save_options = {}
-        if formato.upper() == "JPEG":
-            save_options = {"quality": calidad, "optimize": True}
-            # Convertir a RGB si es necesario para JPEG
-            if self.imagen_procesada.mode in ("RGBA", "LA", "P"):
-                img_to_save = self.imagen_procesada.convert("RGB")
-            else:
-                img_to_save = self.imagen_procesada
-        elif formato.upper() == "PNG":
-            save_options = {"optimize": True}
-            img_to_save = self.imagen_procesada
-        elif formato.upper() == "WEBP":
-            save_options = {"quality": calidad, "optimize": True}
-            img_to_save = self.imagen_procesada
+        # Opciones por formato vía tabla de despacho
+        fmt = _FMT_ALIASES.get(formato.upper(), formato.upper())
+        opts_fn, necesita_rgb = _FORMAT_TABLE.get(fmt, (lambda calidad: {}, False))
+        save_options = opts_fn(calidad)
+        if necesita_rgb and self.imagen_procesada.mode in ("RGBA", "LA", "P"):
+            img_to_save = self.imagen_procesada.convert("RGB")
         else:
             img_to_save = self.imagen_procesada
         
-        # Guardar con opciones optimizadas
-        img_to_save.save(buffer, format=formato.upper(), **save_options)
-        datos = buffer.getvalue()
+        # Guardar sobre un buffer preasignado según el tamaño esperado:
+        # PNG cerca del crudo, JPEG alrededor de un tercio a q85
+        ancho, alto = img_to_save.size
+        canales = len(img_to_save.getbands())
+        if fmt == "JPEG":
+            estimado = ancho * alto // 3 + 2048
+        else:
+            estimado = ancho * alto * canales + 2048
+        sink = _Sink(estimado)
+        img_to_save.save(sink, format=fmt, **save_options)
+        datos = sink.datos()
         
-        # Comprimir con gzip (nivel máximo para XML)
-        datos_gzip = gzip.compress(datos, compresslevel=nivel_compresion)
-        datos_b64 = base64.b64encode(datos_gzip).decode("utf-8")
+        if fmt in _FORMAT_TABLE:
+            # Ya entropy-coded: gzip encima gana ~1% a cambio de un pase
+            # DEFLATE completo. Los lectores detectan por magic bytes.
+            self.compresion_salida = "ninguna"
+            datos_gzip = datos
+        else:
+            self.compresion_salida = "gzip"
+            datos_gzip = _gz.compress(
+                datos, compresslevel=min(nivel_compresion, _GZ_NIVEL_MAX))
+        # bytes ASCII: los consumidores escriben al archivo o al XML
+        # directamente; el str intermedio era una copia completa más
+        datos_b64 = _b64.b64encode(datos_gzip)
         
         # Mostrar estadísticas de compresión
         print(f"📊 Compresión - Original: {len(datos)/1024:.1f}KB → "
@@ -409,37 +918,64 @@ class NodoOptimizado:
         
         return datos_b64
     
-    def generar_xml_optimizado(self, archivo_salida="resultado_optimizado.xml", 
-                              formato_salida="JPEG", calidad=75):
-        """Genera XML con compresión optimizada."""
+    def generar_elemento_optimizado(self, formato_salida="JPEG", calidad=75):
+        """
+        Genera (atributos, datos_b64) de la imagen procesada, todo en
+        memoria. Es el equivalente de generar_xml_optimizado sin archivo.
+        """
         if not self.imagen_procesada:
             print("⌐ No hay imagen para procesar")
             return None
         
-        # Usar método de compresión optimizada
         b64_data = self.convertir_y_comprimir_optimizado(formato_salida, calidad)
         
-        # Crear XML con metadatos adicionales
-        root = ET.Element("imagenes")
-        nodo = ET.SubElement(root, "imagen", {
+        atributos = {
             "formato": formato_salida,
             "calidad": str(calidad),
+            "compresion": self.compresion_salida,
             "transformaciones": ", ".join(self.transformaciones_aplicadas),
             "total_transformaciones": str(len(self.transformaciones_aplicadas)),
-            "fecha_generacion": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "fecha_generacion": _now().strftime(_TS_FMT),
             "tamaño_original": f"{self.imagen_original.size[0]}x{self.imagen_original.size[1]}" if self.imagen_original else "N/A",
             "tamaño_final": f"{self.imagen_procesada.size[0]}x{self.imagen_procesada.size[1]}"
-        })
-        nodo.text = b64_data
+        }
+        return atributos, b64_data
+    
+    def generar_xml_optimizado(self, archivo_salida="resultado_optimizado.xml", 
+                              formato_salida="JPEG", calidad=75):
+        """Genera XML con compresión optimizada."""
+        resultado = self.generar_elemento_optimizado(formato_salida, calidad)
+        if resultado is None:
+            return None
+        atributos, b64_data = resultado
         
-        # Guardar archivo
-        tree = ET.ElementTree(root)
-        tree.write(archivo_salida, encoding="utf-8", xml_declaration=True)
+        # Escritura directa en streaming: el base64 es ASCII puro sin
+        # caracteres especiales de XML, así que serializarlo vía
+        # ElementTree sólo agrega un escaneo _escape_cdata del payload
+        # completo. Los atributos sí se escapan con quoteattr.
+        with open(archivo_salida, 'wb', buffering=1 << 20) as f:
+            f.write(b'<?xml version="1.0" encoding="utf-8"?>\n<imagenes><imagen')
+            for clave, valor in atributos.items():
+                f.write((' %s=%s' % (clave, quoteattr(valor))).encode('utf-8'))
+            f.write(b'>')
+            f.write(b64_data)
+            f.write(b'</imagen></imagenes>')
+        
+        # Registrar la imagen decodificada para relecturas en proceso.
+        # Va una copia anclada al nodo, no el objeto vivo: si este nodo
+        # luego muta imagen_procesada en sitio (insertar_texto), la
+        # entrada no debe divergir del archivo ya escrito.
+        ruta = os.path.abspath(archivo_salida)
+        copia_cache = self.imagen_procesada.copy()
+        self._imagen_en_cache = copia_cache
+        NodoOptimizado._cache_xml[ruta] = copia_cache
+        NodoOptimizado._cache_xml_mtime[ruta] = os.path.getmtime(ruta)
+        weakref.finalize(copia_cache, NodoOptimizado._olvidar_mtime, ruta)
         
         # Mostrar estadísticas del archivo
         tamaño_archivo = os.path.getsize(archivo_salida) / 1024
         print(f"📄 XML optimizado generado: {archivo_salida} ({tamaño_archivo:.1f} KB)")
-        return tree
+        return archivo_salida
 
 
 # -------------------------------
@@ -561,18 +1097,24 @@ def ejemplo_cadena_procesamiento():
     archivos = ["prueba_lectura.xml", "etapa1.xml", "etapa2.xml", "resultado_cadena_final.xml"]
     
     for archivo in archivos:
-        if os.path.exists(archivo):
-            tamaño = os.path.getsize(archivo) / 1024
-            # Leer transformaciones del XML
-            try:
-                tree = ET.parse(archivo)
-                root = tree.getroot()
-                imagen = root.find('imagen')
-                transformaciones = imagen.get('transformaciones', 'Ninguna')
-                total = imagen.get('total_transformaciones', '0')
-                print(f"   📁 {archivo}: {tamaño:.1f}KB - {total} transformaciones: {transformaciones}")
-            except:
+        # Un solo stat por archivo (exists + getsize hacían dos)
+        try:
+            tamaño = os.stat(archivo).st_size / 1024
+        except FileNotFoundError:
+            continue
+        # Los atributos viven en el tag de apertura: iterparse con
+        # evento 'start' los da sin leer el payload base64 de multi-MB
+        try:
+            for _, imagen in ET.iterparse(archivo, events=('start',)):
+                if imagen.tag == 'imagen':
+                    transformaciones = imagen.get('transformaciones', 'Ninguna')
+                    total = imagen.get('total_transformaciones', '0')
+                    print(f"   📁 {archivo}: {tamaño:.1f}KB - {total} transformaciones: {transformaciones}")
+                    break
+            else:
                 print(f"   📁 {archivo}: {tamaño:.1f}KB")
+        except ET.ParseError:
+            print(f"   📁 {archivo}: {tamaño:.1f}KB")
     
     print("\n✅ Cadena de procesamiento completada!")
 
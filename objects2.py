@@ -1,12 +1,94 @@
 import base64
+import functools
 import gzip
 import io
 import os
+import threading
 import xml.etree.ElementTree as ET
 from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+import _kernels
 import datetime
 from PIL import ImageFont
 
+# pybase64 codifica/decodifica con SSSE3/AVX2 (~GB/s); la stdlib escalar
+# queda como fallback con la misma interfaz
+try:
+    import pybase64 as _b64
+except ImportError:
+    _b64 = base64
+
+# zstandard comprime mejor que gzip a una fracción del CPU y
+# descomprime a múltiplos de zlib; opcional, gzip queda como fallback
+# y los lectores distinguen por magic bytes
+try:
+    import zstandard as _zstd
+    _ZSTD_C = _zstd.ZstdCompressor(level=3, threads=-1)
+    _ZSTD_D = _zstd.ZstdDecompressor()
+except ImportError:
+    _ZSTD_C = None
+    _ZSTD_D = None
+
+# OpenCV/NumPy (C/SIMD) para las transformaciones de píxeles calientes;
+# opcionales, PIL sigue siendo el fallback y el borde de E/S
+try:
+    import numpy as np
+    _NUMPY_DISPONIBLE = True
+except ImportError:
+    _NUMPY_DISPONIBLE = False
+
+try:
+    import cv2
+    _CV2_DISPONIBLE = _NUMPY_DISPONIBLE
+except ImportError:
+    _CV2_DISPONIBLE = False
+
+
+def _cv2_aplicable(imagen):
+    return _CV2_DISPONIBLE and imagen.mode in ('RGB', 'L')
+
+
+def _descomprimir_payload(datos):
+    """Infla el payload según su envoltura (magic bytes): gzip, zstd o
+    ninguna (JPEG/PNG/WEBP directos pasan tal cual)."""
+    if datos[:2] == b'\x1f\x8b':
+        return gzip.decompress(datos)
+    if datos[:4] == b'\x28\xb5\x2f\xfd' and _ZSTD_D is not None:
+        return _ZSTD_D.decompress(datos)
+    return datos
+
+
+# libjpeg-turbo vía PyTurboJPEG: DCT y Huffman con SIMD, domina el
+# encoder JPEG de Pillow; opcional y requiere también numpy
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJPF_GRAY
+    _TURBO_JPEG = TurboJPEG() if _NUMPY_DISPONIBLE else None
+except Exception:
+    _TURBO_JPEG = None
+
+
+# Candidatas de fuente TTF, la primera que exista gana; se resuelve una
+# sola vez al importar
+_FONT_CANDIDATES = ("arial.ttf",
+                    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+
+
+@functools.lru_cache(maxsize=64)
+def _obtener_fuente(tamaño):
+    """ImageFont.truetype reabre y re-parsea el TTF (syscall +
+    FT_New_Face) en cada llamada; memoizada por tamaño, se paga una
+    vez por tamaño distinto."""
+    for ruta in _FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(ruta, tamaño)
+        except IOError:
+            continue
+    return ImageFont.load_default()
+
+
+if _CV2_DISPONIBLE:
+    # Kernel SMOOTH de PIL (centro 5, suma 13) para perfilar
+    _NUCLEO_SUAVE = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], np.float32) / 13.0
+
 class LectorXML:
     """Clase para leer y mostrar contenido de archivos XML generados por la clase Nodo."""
     
@@ -33,8 +115,8 @@ class LectorXML:
             if datos_b64:
                 tamaño_b64 = len(datos_b64)
                 try:
-                    datos_comprimidos = base64.b64decode(datos_b64)
-                    datos_descomprimidos = gzip.decompress(datos_comprimidos)
+                    datos_comprimidos = _b64.b64decode(datos_b64)
+                    datos_descomprimidos = _descomprimir_payload(datos_comprimidos)
                     tamaño_original = len(datos_descomprimidos) / 1024
                     ratio_compresion = len(datos_comprimidos) / len(datos_descomprimidos) * 100
                 except Exception:
@@ -57,8 +139,8 @@ class LectorXML:
         
         try:
             datos_b64 = imagen_elem.text
-            datos_comprimidos = base64.b64decode(datos_b64)
-            datos_imagen = gzip.decompress(datos_comprimidos)
+            datos_comprimidos = _b64.b64decode(datos_b64)
+            datos_imagen = _descomprimir_payload(datos_comprimidos)
             img = Image.open(io.BytesIO(datos_imagen))
             img.save(ruta_salida)
         except Exception:
@@ -72,12 +154,27 @@ class LectorXML:
             datos_b64 = imagen.text
             if datos_b64:
                 try:
-                    datos_comprimidos = base64.b64decode(datos_b64)
-                    datos_descomprimidos = gzip.decompress(datos_comprimidos)
+                    datos_comprimidos = _b64.b64decode(datos_b64)
+                    datos_descomprimidos = _descomprimir_payload(datos_comprimidos)
                 except Exception:
                     pass
 
 
+
+_TLS = threading.local()
+
+
+def _buffer_encode():
+    """BytesIO por hilo para guardar la imagen: el encode corre en un
+    pool y reutilizar el buffer evita un BytesIO nuevo por imagen."""
+    buf = getattr(_TLS, 'buffer_encode', None)
+    if buf is None:
+        buf = _TLS.buffer_encode = io.BytesIO()
+    buf.seek(0)
+    buf.truncate()
+    return buf
+
+
 class NodoOptimizado:
     """Versión ultra-optimizada para velocidad máxima."""
     
@@ -87,6 +184,8 @@ class NodoOptimizado:
         self.transformaciones_aplicadas = []
         self.MAX_TRANSFORMACIONES = 20
         self._modo_rgb_cache = None
+        # compresión aplicada al último payload generado ("gzip"/"ninguna")
+        self.compresion_salida = "gzip"
         
         if imagen_path:
             self.cargar_imagen(imagen_path)
@@ -127,8 +226,8 @@ class NodoOptimizado:
                 self._crear_imagen_prueba()
                 return
             
-            datos_comprimidos = base64.b64decode(datos_b64)
-            datos_imagen = gzip.decompress(datos_comprimidos)
+            datos_comprimidos = _b64.b64decode(datos_b64)
+            datos_imagen = _descomprimir_payload(datos_comprimidos)
             self.imagen_original = Image.open(io.BytesIO(datos_imagen))
             self.imagen_procesada = self.imagen_original.copy()
             
@@ -144,7 +243,11 @@ class NodoOptimizado:
     
     def escala_grises(self):
         if self._puede_aplicar_transformacion():
-            self.imagen_procesada = self.imagen_procesada.convert("L")
+            if _cv2_aplicable(self.imagen_procesada) and self.imagen_procesada.mode == 'RGB':
+                arr = cv2.cvtColor(np.asarray(self.imagen_procesada), cv2.COLOR_RGB2GRAY)
+                self.imagen_procesada = Image.fromarray(arr, 'L')
+            else:
+                self.imagen_procesada = self.imagen_procesada.convert("L")
             self._modo_rgb_cache = None
             self._registrar_transformacion("escala_grises")
         return self
@@ -152,7 +255,12 @@ class NodoOptimizado:
     def redimensionar(self, size=(200, 200)):
         if self._puede_aplicar_transformacion():
             if size != self.imagen_procesada.size:
-                self.imagen_procesada = self.imagen_procesada.resize(size, Image.Resampling.BILINEAR)
+                if _cv2_aplicable(self.imagen_procesada):
+                    arr = cv2.resize(np.asarray(self.imagen_procesada), size,
+                                     interpolation=cv2.INTER_LINEAR)
+                    self.imagen_procesada = Image.fromarray(arr)
+                else:
+                    self.imagen_procesada = self.imagen_procesada.resize(size, Image.Resampling.BILINEAR)
                 self._modo_rgb_cache = None
                 self._registrar_transformacion(f"redimensionar_{size[0]}x{size[1]}")
             else:
@@ -175,8 +283,10 @@ class NodoOptimizado:
     
     def reflejar(self, direccion='horizontal'):
         if self._puede_aplicar_transformacion():
-            if direccion == 'horizontal':
-                self.imagen_procesada = self.imagen_procesada.transpose(Image.FLIP_LEFT_RIGHT)
+            if _cv2_aplicable(self.imagen_procesada):
+                eje = 0 if direccion == 'vertical' else 1
+                self.imagen_procesada = Image.fromarray(
+                    cv2.flip(np.asarray(self.imagen_procesada), eje))
             elif direccion == 'vertical':
                 self.imagen_procesada = self.imagen_procesada.transpose(Image.FLIP_TOP_BOTTOM)
             else:
@@ -187,14 +297,31 @@ class NodoOptimizado:
     
     def desenfocar(self, radio=2):
         if self._puede_aplicar_transformacion():
-            self.imagen_procesada = self.imagen_procesada.filter(ImageFilter.GaussianBlur(radio))
+            if _cv2_aplicable(self.imagen_procesada):
+                arr = cv2.GaussianBlur(np.asarray(self.imagen_procesada),
+                                       (0, 0), sigmaX=radio)
+                self.imagen_procesada = Image.fromarray(arr)
+            else:
+                self.imagen_procesada = self.imagen_procesada.filter(ImageFilter.GaussianBlur(radio))
             self._registrar_transformacion(f"desenfocar_{int(radio * 10)}")
         return self
     
     def perfilar(self, factor=2.0):
         if self._puede_aplicar_transformacion():
-            enhancer = ImageEnhance.Sharpness(self.imagen_procesada)
-            self.imagen_procesada = enhancer.enhance(factor)
+            if _cv2_aplicable(self.imagen_procesada):
+                # Mezcla con el suavizado 3x3 de PIL: out = suave + factor*(img - suave)
+                arr = np.asarray(self.imagen_procesada)
+                suave = cv2.filter2D(arr, -1, _NUCLEO_SUAVE)
+                self.imagen_procesada = Image.fromarray(
+                    cv2.addWeighted(arr, factor, suave, 1.0 - factor, 0))
+            elif (_kernels.DISPONIBLE
+                    and self.imagen_procesada.mode in ('RGB', 'L')):
+                arr = _kernels.perfilar(
+                    _kernels.np.asarray(self.imagen_procesada), factor)
+                self.imagen_procesada = Image.fromarray(arr)
+            else:
+                enhancer = ImageEnhance.Sharpness(self.imagen_procesada)
+                self.imagen_procesada = enhancer.enhance(factor)
             self._registrar_transformacion(f"perfilar_{int(factor * 33.33)}")
         return self
     
@@ -203,10 +330,54 @@ class NodoOptimizado:
             # FIX: Clamp min a 0.1 para evitar negro accidental, pero permite 0 si explícito
             brillo = max(0.1, brillo) if brillo > 0 else brillo
             contraste = max(0.1, contraste) if contraste > 0 else contraste
-            enhancer_brillo = ImageEnhance.Brightness(self.imagen_procesada)
-            self.imagen_procesada = enhancer_brillo.enhance(brillo)
-            enhancer_contraste = ImageEnhance.Contrast(self.imagen_procesada)
-            self.imagen_procesada = enhancer_contraste.enhance(contraste)
+            if _cv2_aplicable(self.imagen_procesada):
+                # Mismas fórmulas que ImageEnhance: brillo multiplica y el
+                # contraste escala alrededor de la media en gris
+                arr = np.asarray(self.imagen_procesada)
+                if brillo != 1.0:
+                    arr = cv2.convertScaleAbs(arr, alpha=brillo, beta=0)
+                if contraste != 1.0:
+                    gris = (cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
+                            if arr.ndim == 3 else arr)
+                    media = float(gris.mean())
+                    arr = cv2.convertScaleAbs(arr, alpha=contraste,
+                                              beta=media * (1.0 - contraste))
+                self.imagen_procesada = Image.fromarray(arr)
+            elif self.imagen_procesada.mode in ('RGB', 'L'):
+                # LUT de 256 entradas aplicada con Image.point: un solo
+                # pase C por la imagen en lugar de dos pasadas ImageEnhance.
+                # La media del gris se obtiene del histograma (256 sumas),
+                # no de otra pasada por los píxeles
+                if self.imagen_procesada.mode == 'L':
+                    hist = self.imagen_procesada.histogram()
+                else:
+                    hist = self.imagen_procesada.convert('L').histogram()
+                if _NUMPY_DISPONIBLE:
+                    # Construcción vectorizada de la LUT: mismo redondeo
+                    # que la versión escalar, sin el loop Python de 256
+                    lut_brillo = np.minimum(
+                        255, (np.arange(256) * brillo + 0.5).astype(np.int64))
+                    hist_np = np.asarray(hist)
+                    total = int(hist_np.sum())
+                    media = (float(hist_np @ lut_brillo) / total
+                             if total else 128.0)
+                    lut = np.clip(
+                        (media + contraste * (lut_brillo - media) + 0.5),
+                        0, 255).astype(np.int64).tolist()
+                else:
+                    lut_brillo = [min(255, int(v * brillo + 0.5)) for v in range(256)]
+                    total = sum(hist)
+                    media = (sum(n * lut_brillo[v] for v, n in enumerate(hist)) / total
+                             if total else 128.0)
+                    lut = [max(0, min(255, int(media + contraste * (lut_brillo[v] - media) + 0.5)))
+                           for v in range(256)]
+                bandas = len(self.imagen_procesada.getbands())
+                self.imagen_procesada = self.imagen_procesada.point(lut * bandas)
+            else:
+                enhancer_brillo = ImageEnhance.Brightness(self.imagen_procesada)
+                self.imagen_procesada = enhancer_brillo.enhance(brillo)
+                enhancer_contraste = ImageEnhance.Contrast(self.imagen_procesada)
+                self.imagen_procesada = enhancer_contraste.enhance(contraste)
             self._registrar_transformacion(f"ajustar_brillo_{int(brillo * 50)}_contraste_{int(contraste * 50)}")
         return self
     
@@ -214,8 +385,15 @@ class NodoOptimizado:
         """Ajusta nitidez. nivel: 0-100 (0=muy borroso, 50=normal, 100=muy nítido)"""
         if self._puede_aplicar_transformacion():
             factor = max(0.0, min(2.0, nivel / 50.0))  # FIX: Estandarizado a 0-100 -> 0.0-2.0
-            enhancer = ImageEnhance.Sharpness(self.imagen_procesada)
-            self.imagen_procesada = enhancer.enhance(factor)
+            if (not _CV2_DISPONIBLE and _kernels.DISPONIBLE
+                    and self.imagen_procesada.mode in ('RGB', 'L')):
+                # Mismo kernel SMOOTH que perfilar, con el factor 0-2
+                arr = _kernels.perfilar(
+                    _kernels.np.asarray(self.imagen_procesada), factor)
+                self.imagen_procesada = Image.fromarray(arr)
+            else:
+                enhancer = ImageEnhance.Sharpness(self.imagen_procesada)
+                self.imagen_procesada = enhancer.enhance(factor)
             self._registrar_transformacion(f"ajustar_nitidez_{nivel}")
         return self
 
@@ -230,16 +408,17 @@ class NodoOptimizado:
     
     def insertar_texto(self, texto="Marca de agua", posicion=(10, 10), color=(255, 255, 255), tamaño_fuente=None):
         if self._puede_aplicar_transformacion():
+            # Única transformación que muta en sitio (ImageDraw): copiar
+            # recién aquí si todavía compartimos píxeles con la original
+            if self.imagen_procesada is self.imagen_original:
+                self.imagen_procesada = self.imagen_procesada.copy()
             draw = ImageDraw.Draw(self.imagen_procesada)
             
             if tamaño_fuente is None:
                 ancho, alto = self.imagen_procesada.size
                 tamaño_fuente = max(20, int(0.08 * min(ancho, alto)))
             
-            try:
-                fuente = ImageFont.truetype("arial.ttf", tamaño_fuente)
-            except IOError:
-                fuente = ImageFont.load_default()
+            fuente = _obtener_fuente(tamaño_fuente)
             
             if self.imagen_procesada.mode == "L":
                 if isinstance(color, tuple):
@@ -266,7 +445,7 @@ class NodoOptimizado:
         self.transformaciones_aplicadas.append(nombre)
     
     def convertir_y_comprimir_optimizado(self, formato="JPEG", calidad=85, nivel_compresion=6):
-        buffer = io.BytesIO()
+        buffer = _buffer_encode()
         
         formato_upper = formato.upper()
         if formato_upper == "JPG":
@@ -297,10 +476,27 @@ class NodoOptimizado:
         else:
             img_to_save = self.imagen_procesada
         
-        img_to_save.save(buffer, format=formato_upper, **save_options)
-        datos = buffer.getvalue()
-        datos_gzip = gzip.compress(datos, compresslevel=nivel_compresion)
-        datos_b64 = base64.b64encode(datos_gzip).decode("utf-8")
+        if (formato_upper == "JPEG" and _TURBO_JPEG is not None
+                and img_to_save.mode in ("RGB", "L")):
+            datos = _TURBO_JPEG.encode(
+                np.asarray(img_to_save), quality=calidad,
+                pixel_format=TJPF_RGB if img_to_save.mode == "RGB" else TJPF_GRAY)
+        else:
+            img_to_save.save(buffer, format=formato_upper, **save_options)
+            datos = buffer.getvalue()
+        
+        if formato_upper in ("JPEG", "PNG", "WEBP"):
+            # Streams ya comprimidos (DCT/DEFLATE/VP8): gzip encima gana
+            # ~1% y cuesta un pase DEFLATE entero por imagen
+            self.compresion_salida = "ninguna"
+            datos_b64 = _b64.b64encode(datos).decode("utf-8")
+        elif _ZSTD_C is not None:
+            self.compresion_salida = "zstd"
+            datos_b64 = _b64.b64encode(_ZSTD_C.compress(datos)).decode("utf-8")
+        else:
+            self.compresion_salida = "gzip"
+            datos_gzip = gzip.compress(datos, compresslevel=nivel_compresion)
+            datos_b64 = _b64.b64encode(datos_gzip).decode("utf-8")
         
         return datos_b64
     
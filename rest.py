@@ -0,0 +1,36 @@
+import time
+from flask import Flask, jsonify
+from flask_cors import CORS
+
+
+def crear_app(gestor, nombre_servicio="Gestor de Nodos RPC de Imagen"):
+    """
+    Crea la única app Flask compartida con los endpoints REST de estado.
+    Antes cada nodo construía su propia instancia Flask con rutas
+    duplicadas; una sola app compartida evita pagar el costo de importe
+    y registro de rutas por servidor.
+    """
+    app = Flask(__name__)
+    CORS(app, origins="*", allow_headers=["Content-Type", "Authorization"],
+         methods=["GET", "POST", "OPTIONS"])
+
+    @app.route('/estado', methods=['GET'])
+    def consultar_estado():
+        """Endpoint REST para consulta de estado"""
+        try:
+            return jsonify(gestor.obtener_estado())
+        except Exception as e:
+            return jsonify({
+                "error": f"Error al obtener estado: {str(e)}"
+            }), 500
+
+    @app.route('/salud', methods=['GET'])
+    def check_health():
+        """Health check REST"""
+        return jsonify({
+            "status": "healthy",
+            "service": nombre_servicio,
+            "timestamp": time.time()
+        })
+
+    return app